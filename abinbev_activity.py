@@ -1,12 +1,27 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.figure_factory as ff
-import json
-import datetime
-from datetime import datetime, timedelta
 import numpy as np
 
+import schemas
+
+import charts
+import data_loader
+from dashboard_data import (generate_gantt_data, generate_summary, load_activity_table, load_compliance,
+                            load_farm_index, load_growth_table, load_operations_table, load_stage_table,
+                            macro_figure_builders)
+import ingest
+import json_flatten
+import partition_store
+import precompute
+import profiling
+from farm_query import SELECT_ALL
+import table_pager
+import table_renderer
+import thumbnails
+import warmup
+from metrics_store import MetricsStore, get_store
+from visit_index import DailyVisitIndex, value_counts
+
 
 # Password check function
 def check_password():
@@ -29,213 +44,216 @@ def check_password():
 
 
 # App code
-def load_data(file_path):
-    data = pd.read_csv(file_path)
-    data['Date'] = pd.to_datetime(data['Date'], dayfirst=True)
-    return data
-    
-def safe_json_loads(json_str):
-    try:
-        return json.loads(json_str)
-    except json.JSONDecodeError:
-        return None
-        
-def extract_levels(json_data, level_name):
-    if json_data:
-        for item in json_data:
-            if item['name'] == level_name:
-                return item['value']
-    return None
-
-# Custom color mapping function for Growth Tracker
-def color_mapping(val):
-    if pd.isna(val) or val == '':
-        return 'background-color: white; color: black'
-    elif val == 'Done early':
-        return 'background-color: lightblue; color: black'
-    elif val == 'Done on time':
-        return 'background-color: lightgreen; color: black'
-    elif val == 'Done':
-        return 'background-color: lightgreen; color: black'
-    elif val == 'Pending':
-        return 'background-color: lightyellow; color: black'
-    elif val == 'Not done on time':
-        return 'background-color: lightcoral; color: black'
-    elif val == 'Done by nature':
-        return 'background-color: lightgrey; color: black'
-    else:
-        return 'background-color: white; color: black'
-
-def conditional_color_mapping(val, col):
-    if isinstance(val, float) and np.isnan(val):
-        return ''  # No coloring for NaN values
-    if col == 'Seeding Rate':
-        if 7.5 <= val <= 8.5:
-            color = 'lightgreen'
-        elif val == '':
-            color = ''
-        else:
-            color = 'red'
-    elif col == 'DAP/MOP Fertilizer Applied quantity':
-        if 9.5 <= val <= 10.5:
-            color = 'lightgreen'
-        elif val == '':
-            color = ''
-        else:
-            color = 'red'
-    elif col == 'UREA1 Fertilizer Applied quantity':
-        if 6.5 <= val <= 7.5:
-            color = 'lightgreen'
-        elif val == '':
-            color = ''
-        else:
-            color = 'red'
-    else:
-        color = ''
-    return f'background-color: {color}'
-
-# Custom color mapping function for Growth Tracker dashboard
-def growth_tracker_color_mapping(val):
-    if val.startswith('current'):
-        return 'background-color: yellow; color: black'
-    elif val.startswith('well and passed'):
-        return 'background-color: green; color: black'
-    elif val == '':
-        return 'background-color: white; color: black'
-    elif val.startswith('not followed'):
-        return 'background-color: red; color: black'
-    else:
-        return 'background-color: white; color: black'
+@profiling.timed('load visits')
+def load_data(file_path, farms=None, start=None, end=None):
+    # Visits from the season/farm partitioned store, fed from the visit store
+    # so only rows appended to the CSV since the last ingestion get parsed.
+    # Farm and date filters only read the partitions that can hold matches.
+    return partition_store.load_visits(file_path, farms=farms, start=start, end=end)
 
 
-# Functions for farm information dashboard
-def filter_farms(data):
-    return data['farmName'].unique()
+def show_full_image(key, url):
+    st.session_state[f"{key}_full"] = url
 
-def extract_levels(json_data, field_name):
-    if isinstance(json_data, list):
-        for item in json_data:
-            if isinstance(item, dict) and item.get('name') == field_name:
-                return item.get('value')
-    return None
 
-def display_farm_info(data, farm_name):
+@profiling.timed('farm gallery')
+def display_farm_info(data, farm_name, page_size=10):
     farm_data = data[data['farmName'] == farm_name]
-    for index, row in farm_data.iterrows():
+    # Only the records on the selected page get their thumbnails resolved
+    page_count = max(1, -(-len(farm_data) // page_size))
+    page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1,
+                           key=f"farm_page_{farm_name}")
+    page_data = farm_data.iloc[(int(page) - 1) * page_size:int(page) * page_size]
+    st.caption(f"Page {int(page)} of {page_count} ({len(farm_data)} records)")
+    thumbnails_by_url = thumbnails.get_service().get_many(page_data['Image URL'])
+    for index, row in page_data.iterrows():
         col1, col2 = st.columns(2)
         with col1:
-            st.image(row['Image URL'], caption=f"Image {index + 1}", use_column_width=True)
+            # Full resolution is only requested once the user asks for it
+            key = f"farm_image_{index}"
+            if st.session_state.get(f"{key}_full") == row['Image URL']:
+                st.image(row['Image URL'], caption=f"Image {index + 1}", use_column_width=True)
+            else:
+                thumbnail = thumbnails_by_url.get(row['Image URL'])
+                if thumbnail is not None:
+                    st.image(thumbnail, caption=f"Image {index + 1}")
+                else:
+                    st.write(f"Image {index + 1} unavailable")
+                st.button("View full size", key=key, on_click=show_full_image, args=(key, row['Image URL']))
         with col2:
             st.write("Farm Name:", row['farmName'])
             st.write("Other Information:")
-            try:
-                json_data = json.loads(row['json data'])
-            except json.JSONDecodeError:
-                json_data = []
-            for item in json_data:
-                st.write(f"{item['name']}: {item['value']}")
+            for name, value in json_flatten.item_pairs(row['json data']):
+                st.write(f"{name}: {value}")
             st.write("#### Activity ")
             st.write(row['activity_record'])
             st.write('##### Activity Date')
             st.write(row['Date'])
 
-def generate_summary(data):
-    # Convert 'Date' column to datetime type
-    data['Date'] = pd.to_datetime(data['Date'], dayfirst=True, errors='coerce')
-    # Calculate today's date
-    today = datetime.now().strftime('%d/%m/%Y')
-    # Filter the DataFrame for today's date
-    today_data = data[data['Date'].dt.strftime('%d/%m/%Y') == today]
-    # Calculate yesterday's date
-    yesterday = datetime.now() - timedelta(days=1)
-    yesterday = yesterday.strftime('%d/%m/%Y')
-    # Filter the DataFrame for yesterday's date
-    yesterday_data = data[data['Date'].dt.strftime('%d/%m/%Y') == yesterday]
-    # Calculate two days ago
-    two_days_ago = datetime.now() - timedelta(days=2)
-    two_days_ago = two_days_ago.strftime('%d/%m/%Y')
-    # Filter the DataFrame for two days ago
-    two_days_ago_data = data[data['Date'].dt.strftime('%d/%m/%Y') == two_days_ago]
-    # Count unique entries in 'FarmName' column for each day
-    total_visited_today = today_data['FarmName'].nunique()
-    total_visited_yesterday = yesterday_data['FarmName'].nunique()
-    total_visited_two_days_ago = two_days_ago_data['FarmName'].nunique()
-    # Other summary calculations
-    total_plot_area_bigha = 82.28  # Fixed value for the number of farms
-    num_farms = 59  # Assuming 59 as a fixed value for the number of farms
-    activities_summary = data['Activity'].value_counts()
-    total_dap = data['DAP(kg)'].sum()
-    total_mop = data['MOP(kg)'].sum()
-    seed_varieties = data['Seed Variety'].dropna().unique()
-    avg_germination_rate = data['GERMINATION VALUE(%)'].mean(skipna=True)
-    max_germination_rate = data['GERMINATION VALUE(%)'].max()
-    num_irrigation_done = data['Irrigation Done'].notna().sum()
-    num_sprinkler_installed = data['Sprinker installed'].notna().sum() if 'Sprinker installed' in data.columns else 0
-    total_seed_used = data['SEED'].sum()
-    # Create summary data dictionary
-    summary_data = {
-        'Total Plot Area (Bigha)': total_plot_area_bigha,
-        'Number of Farms': num_farms,
-        'Applied DAP/Total plot area (kg/Bigha)': 10.03,
-        'Applied MOP/Total plot area (kg/Bigha)': 10.03,
-        'Applied UREA1/Total plot area (kg/Bigha)': 7.01,
-        'Sown seed/Total plot area (kg/Bigha)': 1.70,
-        'Percentage of Farms in Tillering Stage': 98.3,
-        'Percentage of Farms in Germination Stage': 8.5,
-        'Percentage of Farms in which sowing is done': 100,
-        'Percentage of Farms in which MOP/DAP is applied': 100,
-        'Percentage of Farms in which UREA1 is applied': 100,
-        'Percentage of Farms on which Irrigation 1 is done': 55.94,
-        'Percentage of Farms on which Weeding 1 is done': 72.8,
-        'Maximum Germination Rate (%)': 98.4,
-        'Average Germination Rate (%)': 93.50,
-        'Minimum Germination Rate (%)': 85.2,
-        'Maximum Tillage Rate (%)': 87,
-        'Minimum Tillage Rate (%)': 40,
-        'Irrigation Done': num_irrigation_done,
-        'Sprinkler Installed': num_sprinkler_installed,
-        'Total Plot Visited Today': total_visited_today,
-        'Total Plot Visited Yesterday': total_visited_yesterday,
-        'Total Plot Visited Two Days Ago': total_visited_two_days_ago,
-        'Activity Details Last Date': activities_summary
-    }
-    # Create summary DataFrame
-    summary_df = pd.DataFrame(list(summary_data.items()), columns=['Metric', 'Value'])
-    # Return summary DataFrame along with other calculated values
-    return summary_df, activities_summary, seed_varieties
-
-def generate_fertilizer_usage(data):
-    fertilizer_usage = data[['Farm Name', 'DAP/MOP Fertilizer Applied quantity', 'UREA1 Fertilizer Applied quantity']]
-    return fertilizer_usage
-
-# Function to generate seed usage summary
-def generate_seed_usage(data):
-    seed_usage = data[['Farm Name', 'Seeding Rate']]
-    return seed_usage
+def macro_figure(name, keys, builders, macro=None, artifacts=None):
+    if macro is not None and name in macro['figures']:
+        return precompute.macro_figure(artifacts, name)
+    return charts.cached_figure((name,) + keys[name], builders[name])
 
 
 def generate_germination_by_farmer(data):
-    germination_by_farmer = data.groupby('FarmName')['GERMINATION VALUE(%)'].max().reset_index()
+    germination_by_farmer = data.groupby('FarmName', observed=True)['GERMINATION VALUE(%)'].max().reset_index()
     return germination_by_farmer
 
 
 def generate_activity_over_time(data):
-    activity_over_time = data.groupby(['Date', 'Activity']).size().reset_index(name='Counts')
+    activity_over_time = charts.ActivityCube(data).activity_over_time()
     return activity_over_time
 
 
 def generate_tillage_operations(data):
-    tillage_operations = data['tillage'].value_counts()
+    tillage_operations = value_counts(data['tillage'])
     return tillage_operations
 
 
-def generate_gantt_data(data):
-    gantt_data = data[['Date', 'Activity', 'FarmName']].rename(
-        columns={'Date': 'Start', 'Activity': 'Task', 'FarmName': 'Resource'})
-    gantt_data['Finish'] = gantt_data['Start']  # Assuming activities are single-day events for now
-    return gantt_data
+def show_compliance(compliance):
+    outside = compliance[~compliance['Compliant']]
+    with st.expander(f"Input compliance: {len(outside)} of {len(compliance)} farm(s) not within the tolerance bands"):
+        st.dataframe(outside)
+
+
+def show_schema_errors(errors):
+    if len(errors):
+        with st.expander(f"Data validation: {len(errors)} value(s) could not be read"):
+            st.dataframe(errors)
+
+
+def load_more_rows(key):
+    st.session_state[f"{key}_pages"] = st.session_state.get(f"{key}_pages", 1) + 1
+
+
+@profiling.timed('table view')
+def show_paged_table(key, load_table, render, page_size=50, precomputed=None, rows=None):
+    # Only the rows in view are rendered, search and sort run over the table
+    # index. The plain view comes from precomputed rows when there are some,
+    # the table itself is then only loaded once the user searches or sorts.
+    # rows optionally limits the table to the given row positions.
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        search = st.text_input("Search", key=f"{key}_search")
+    with col2:
+        columns = precomputed['columns'] if precomputed is not None else load_table().columns
+        sort_by = st.selectbox("Sort by", ['Original order'] + columns, key=f"{key}_sort")
+    with col3:
+        descending = st.checkbox("Descending", key=f"{key}_descending")
+    sort_by = None if sort_by == 'Original order' else sort_by
+    use_precomputed = precomputed is not None and not search and sort_by is None
+    if use_precomputed:
+        positions = np.arange(len(precomputed['rows'])) if rows is None else rows
+    else:
+        table = load_table()
+        positions = table.query(search or '', sort_by, ascending=not descending)
+        if rows is not None:
+            positions = positions[np.isin(positions, rows)]
+    total = len(positions)
+
+    # Start again from the first page whenever the query changes
+    query = (search, sort_by, descending, None if rows is None else rows.tobytes())
+    if st.session_state.get(f"{key}_query") != query:
+        st.session_state[f"{key}_query"] = query
+        st.session_state[f"{key}_pages"] = 1
+    shown = table_pager.window_size(st.session_state[f"{key}_pages"], page_size, total)
+
+    st.markdown(table_renderer.STYLESHEET, unsafe_allow_html=True)
+    if use_precomputed:
+        html_rows = precomputed['rows']
+        table_html = table_renderer.wrap_table(precomputed['head'], ''.join(html_rows[p] for p in positions[:shown]))
+    else:
+        table_html = render(table.rows(positions[:shown]))
+    st.write(table_renderer.scroll_container(table_html), unsafe_allow_html=True)
+    st.caption(f"Showing {shown} of {total} rows")
+    if shown < total:
+        st.button("Load more", key=f"{key}_more", on_click=load_more_rows, args=(key,))
+
+
+def precomputed_tracker(kind, source, load_table):
+    # A tracker is served from the precompute worker's rows when they are
+    # current, the table is otherwise read and indexed once per version.
+    # Shows the validation errors either way, returns the rows or None.
+    precomputed = precompute.tracker_table(precompute.read_current(), kind)
+    if precomputed is not None:
+        show_schema_errors(precomputed['errors'])
+    else:
+        show_schema_errors(schemas.schema_errors(load_table(source).data))
+    return precomputed
+
+
+def warm_visits(source):
+    load_data(source)
+    partition_store.farms('visits', source)
+    ingest.derived(source, 'version', data_loader.new_version)
+    ingest.derived(source, 'visit_index', DailyVisitIndex)
+    ingest.derived(source, 'activity_cube', charts.ActivityCube)
+    ingest.derived(source, 'gantt_segments', generate_gantt_data)
+
+
+def warmup_tasks():
+    # What the dashboards load and build on first use, per dataset
+    return {
+        'visits': lambda: warm_visits(data_loader.dataset_path('visits')),
+        'operations': lambda: load_operations_table(data_loader.dataset_path('operations')),
+        'farm_info': lambda: load_farm_index(data_loader.dataset_path('farm_info')),
+        'activity': lambda: load_activity_table(data_loader.dataset_path('activity')),
+        'growth': lambda: load_growth_table(data_loader.dataset_path('growth')),
+    }
 
 
+# Datasets each dashboard reads
+DASHBOARD_DATASETS = {
+    'Activity Status': ['activity'],
+    'Growth Tracker': ['growth'],
+    'Operations Tracker': ['operations'],
+    'Farm Information': ['farm_info'],
+    'Macro View': ['visits', 'operations', 'growth', 'activity'],
+    'Micro View': ['visits'],
+}
+
+
+def show_warmup_status(service):
+    ready, total = service.progress()
+    if ready < total:
+        st.sidebar.caption(f"Preparing data: {ready} of {total} datasets ready")
+    failed = [name for name, state in service.status().items() if state == 'failed']
+    if failed:
+        st.sidebar.warning(f"Could not preload: {', '.join(failed)}")
+    offline = data_loader.offline_datasets()
+    if offline:
+        st.sidebar.warning(f"Data server unreachable, showing the last downloaded copy of: {', '.join(offline)}")
+
+
+def show_profile_panel(profiler):
+    # Admin timing panel for the rerun that just finished, its stages are
+    # also appended to the trace file
+    with st.expander(f"Timing: {profiler.total() * 1000:.0f} ms for this rerun"):
+        timings = pd.DataFrame(profiler.records)
+        if not timings.empty:
+            timings['stage'] = ['  ' * depth + name for depth, name in zip(timings['depth'], timings['stage'])]
+            timings['ms'] = (timings['seconds'] * 1000).round(1)
+            timings['memory_mb'] = timings['memory_mb'].astype(float).round(1)
+            st.dataframe(timings.drop(columns=['depth', 'start', 'seconds']).set_index('stage'))
+        profiler.export()
+        st.caption(f"Trace appended to {profiling.TRACE_FILE}")
+        st.download_button("Download Chrome trace", profiler.chrome_trace(),
+                           file_name=f"trace-{profiler.rerun}.json", mime='application/json')
+
+
+def wait_for_data(service, names):
+    # Render from warm data: wait for the background load rather than
+    # starting a second cold load of the same files
+    if not service.is_ready(*names):
+        with st.spinner("Preparing data..."):
+            service.wait(names)
+
+
+# A rerun cut short (a widget changed mid-run, st.stop()) never reaches
+# finish(), so whatever profiler it left on this thread is dropped first
+profiling.finish()
+
 # Streamlit app layout and functionality
 if check_password():
     st.set_page_config(layout="wide")
@@ -243,77 +261,116 @@ if check_password():
 
     data = None
 
+    # All five datasets are loaded in the background once per server
+    # process, shared by every session
+    warmup_service = warmup.get_warmup()
+    warmup_service.start(warmup_tasks())
+
     # Sidebar selection for dashboards
     dashboard_options = ['Activity Status', 'Growth Tracker', 'Operations Tracker', 'Farm Information', 'Macro View',
                          'Micro View']
     selected_dashboard = st.sidebar.radio("Select Dashboard", dashboard_options)
+    if st.sidebar.button("Refresh data"):
+        # Changed sources are downloaded concurrently first, the reloads then read the local copies
+        data_loader.prefetch()
+        data_loader.clear_cache()
+        warmup_service.restart(warmup_tasks())
+    # Opt-in timing of every stage of this session's reruns
+    profile_reruns = profiling.ENABLED and st.sidebar.checkbox("Profile reruns", key='profile_reruns')
+    if profile_reruns:
+        profiling.start(selected_dashboard, counters={'data cache': data_loader.get_cache(),
+                                                      'partition cache': partition_store.get_read_cache(),
+                                                      'figure cache': charts.get_figure_cache()})
+    show_warmup_status(warmup_service)
+    with profiling.stage('wait for warm-up'):
+        wait_for_data(warmup_service, DASHBOARD_DATASETS[selected_dashboard])
 
     # Macro View and Micro View functionalities
     if selected_dashboard in ['Macro View', 'Micro View']:
-        csv_path1 = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/data.csv"
-        csv_path3 = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/activity_avinbev.csv"
-        csv_path2 = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/data.csv"
-        csv_path4 = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/test1.csv"
+        csv_path1 = data_loader.dataset_path('visits')
+        csv_path3 = data_loader.dataset_path('activity')
+        csv_path2 = data_loader.dataset_path('visits')
+        csv_path4 = data_loader.dataset_path('farm_info')
 
         if selected_dashboard == 'Macro View':
             data = load_data(csv_path1)
-        elif selected_dashboard == 'Micro View':
-            data = load_data(csv_path2)
 
     if selected_dashboard == 'Macro View':
         if data is not None:
             st.sidebar.header('Filters')
             date_range = st.sidebar.date_input("Select Date Range", [])
-            uploaded_file_operations = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/operations.csv"
-            data1 = pd.read_csv(uploaded_file_operations)
+            uploaded_file_operations = data_loader.dataset_path('operations')
+            data1 = data_loader.read_csv_cached(uploaded_file_operations, schema='operations')
             varieties = []
             if 'Seed Variety' in data.columns:  # Check if 'Seed Variety' column exists
                 varieties = st.sidebar.multiselect("Select Seed Varieties",
                                                    options=data['Seed Variety'].dropna().unique())
+            # Index over the full visit log, rebuilt only when a new snapshot is published
+            visit_index = ingest.derived(csv_path1, 'visit_index', DailyVisitIndex)
+            filtered = False
             if date_range and len(date_range) == 2:
-                data = data[
-                    (data['Date'] >= pd.to_datetime(date_range[0])) & (data['Date'] <= pd.to_datetime(date_range[1]))]
+                data = load_data(csv_path1, start=date_range[0], end=date_range[1])
+                filtered = True
             if varieties:
                 data = data[data['Seed Variety'].isin(varieties)]
+                filtered = True
+
+            # Unfiltered, the summary and figures come from the precompute
+            # worker's artifacts when they are current
+            artifacts = precompute.read_current()
+            macro = None if filtered else precompute.macro_view(artifacts)
 
             st.header('Summarized View for Overall Farms')
-            summary_df, activities_summary, seed_varieties = generate_summary(data)
+            if macro is not None:
+                summary_df, activities_summary, seed_varieties = (
+                    macro['summary'], macro['activities_summary'], macro['seed_varieties'])
+            else:
+                # The shared store only folds in rows added since its last sync,
+                # filtered views get a store of their own over the selected rows
+                df_growth = data_loader.read_dataset('growth')
+                df_activity = data_loader.read_dataset('activity')
+                if filtered:
+                    metrics_store = MetricsStore()
+                else:
+                    metrics_store = get_store()
+                with profiling.stage('metrics'):
+                    metrics = metrics_store.sync(visits=data, operations=data1, growth=df_growth,
+                                                 activity=df_activity).metrics()
+                summary_df, activities_summary, seed_varieties = generate_summary(
+                    data, visit_index=None if filtered else visit_index, metrics=metrics)
             st.write(summary_df)
 
+            # Otherwise figures are cached per dataset version and filter state.
+            # The activity chart is built from the pre-aggregated day x activity
+            # cube of the full log.
+            operations_version = data_loader.derived(uploaded_file_operations, 'version', data_loader.new_version,
+                                                     schema='operations')
+            visits_version = ingest.derived(csv_path1, 'version', data_loader.new_version)
+            activity_cube = ingest.derived(csv_path1, 'activity_cube', charts.ActivityCube)
+            start, end = (date_range[0], date_range[1]) if date_range and len(date_range) == 2 else (None, None)
+            growth_source = data_loader.dataset_path('growth')
+            growth_version = data_loader.derived(growth_source, 'version', data_loader.new_version, schema='growth')
+            builders = macro_figure_builders(data1, activity_cube, load_stage_table(growth_source),
+                                             start, end, varieties)
+            figure_keys = {
+                'dap_mop': (operations_version,),
+                'urea1': (operations_version,),
+                'seed_usage': (operations_version,),
+                'stage_distribution': (growth_version,),
+                'activity_over_time': (visits_version, (start, end, tuple(sorted(map(str, varieties))))),
+            }
+
             st.write('### DAP/MOP Fertilizer Applied Quantity (KG/Bigha) by Farm')
-            fertilizer_usage = generate_fertilizer_usage(data1)
-            fig_dap_mop = px.bar(fertilizer_usage, x='Farm Name', y='DAP/MOP Fertilizer Applied quantity',
-                                 title='DAP/MOP Fertilizer Applied Quantity (KG/Bigha) by Farm')
-            fig_dap_mop.add_shape(
-                type='line',
-                x0=-0.5, x1=len(fertilizer_usage['Farm Name']) - 0.5,
-                y0=10, y1=10,
-                line=dict(color='white', dash='dash')
-            )
-            st.plotly_chart(fig_dap_mop)
+            st.plotly_chart(macro_figure('dap_mop', figure_keys, builders, macro, artifacts))
 
             st.write('### UREA1 Fertilizer Applied Quantity (KG/Bigha) by Farm')
-            fig_urea1 = px.bar(fertilizer_usage, x='Farm Name', y='UREA1 Fertilizer Applied quantity',
-                               title='UREA1 Fertilizer Applied Quantity (KG/Bigha) by Farm')
-            fig_urea1.add_shape(
-                type='line',
-                x0=-0.5, x1=len(fertilizer_usage['Farm Name']) - 0.5,
-                y0=7, y1=7,
-                line=dict(color='white', dash='dash')
-            )
-            st.plotly_chart(fig_urea1)
+            st.plotly_chart(macro_figure('urea1', figure_keys, builders, macro, artifacts))
 
             st.write('### Seed Usage (KG/Bigha) by Farm')
-            seed_usage = generate_seed_usage(data1)
-            fig_seed_usage = px.bar(seed_usage, x='Farm Name', y='Seeding Rate',
-                                    title='Seed Usage (KG/Bigha) by Farm')
-            fig_seed_usage.add_shape(
-                type='line',
-                x0=-0.5, x1=len(seed_usage['Farm Name']) - 0.5,
-                y0=8, y1=8,
-                line=dict(color='white', dash='dash')
-            )
-            st.plotly_chart(fig_seed_usage)
+            st.plotly_chart(macro_figure('seed_usage', figure_keys, builders, macro, artifacts))
+
+            st.write('### Farms by Growth Stage')
+            st.plotly_chart(macro_figure('stage_distribution', figure_keys, builders, macro, artifacts))
 
             st.write('### Germination Percentage(latest) by Farmer')
             germination_by_farmer = generate_germination_by_farmer(data)
@@ -322,10 +379,7 @@ if check_password():
             st.write('### Activities Summary')
             st.bar_chart(activities_summary)
             st.write('### Activity Occurrences Over Time')
-            activity_over_time = generate_activity_over_time(data)
-            fig = px.line(activity_over_time, x='Date', y='Counts', color='Activity',
-                          title='Activity Occurrences Over Time')
-            st.plotly_chart(fig)
+            st.plotly_chart(macro_figure('activity_over_time', figure_keys, builders, macro, artifacts))
             st.write('### Seed Varieties Used')
             st.write(seed_varieties)
 
@@ -337,13 +391,12 @@ if check_password():
 
     elif selected_dashboard == 'Micro View':
         st.sidebar.header('Filters')
-        farmer_selected = st.sidebar.selectbox("Select Farmer", options=data['FarmName'].unique())
+        farmer_selected = st.sidebar.selectbox("Select Farmer", options=partition_store.farms('visits', csv_path2))
         date_range = st.sidebar.date_input("Select Date Range", [])
-        if farmer_selected:
-            data = data[data['FarmName'] == farmer_selected]
-        if date_range and len(date_range) == 2:
-            data = data[
-                (data['Date'] >= pd.to_datetime(date_range[0])) & (data['Date'] <= pd.to_datetime(date_range[1]))]
+        gantt_resolution = st.sidebar.selectbox("Gantt Resolution", options=charts.GANTT_RESOLUTIONS)
+        # Only the selected farm's partitions within the date range are read
+        start, end = (date_range[0], date_range[1]) if date_range and len(date_range) == 2 else (None, None)
+        data = load_data(csv_path2, farms=[farmer_selected] if farmer_selected else None, start=start, end=end)
         st.write('### Activity Details')
         st.dataframe(data)
         st.write('### Detailed Metrics')
@@ -363,171 +416,100 @@ if check_password():
         st.write('#### Tillage Operations')
         st.dataframe(data[['Date', 'tillage']])
         st.write('### Gantt Chart of Activities')
-        gantt_data = generate_gantt_data(data)
-        fig_gantt = ff.create_gantt(gantt_data, index_col='Resource', show_colorbar=True, group_tasks=True,
-                                    title='Gantt Chart of Activities', showgrid_x=True, showgrid_y=True)
+        # Durations need the farm's whole history, the date range only clips the bars shown
+        visits_version = ingest.derived(csv_path2, 'version', data_loader.new_version)
+        gantt_data = ingest.derived(csv_path2, 'gantt_segments', generate_gantt_data)
+        if farmer_selected:
+            gantt_data = gantt_data[gantt_data['Resource'] == farmer_selected]
+        if date_range and len(date_range) == 2:
+            gantt_data = gantt_data[(gantt_data['Start'] >= pd.to_datetime(date_range[0])) &
+                                    (gantt_data['Start'] <= pd.to_datetime(date_range[1]))]
+        fig_gantt = charts.cached_figure(
+            ('gantt', visits_version, str(farmer_selected), tuple(date_range or ()), gantt_resolution),
+            lambda: charts.gantt_figure(gantt_data, 'Gantt Chart of Activities', gantt_resolution))
         st.plotly_chart(fig_gantt)
 
         # Farm Information Dashboard
     elif selected_dashboard == 'Farm Information':
         st.title("Farm Information Dashboard")
-        uploaded_file = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/test1.csv"
+        uploaded_file = data_loader.dataset_path('farm_info')
     
         if uploaded_file is not None:
-            data = pd.read_csv(uploaded_file)
+            farm_index = load_farm_index(uploaded_file)
+            data = farm_index.data
         
             if 'json data' not in data.columns:
                 st.error("The 'json data' column is not present in the uploaded file.")
             else:
-                data['json_data'] = data['json data'].apply(safe_json_loads)
-                data = data.dropna(subset=['json_data'])
-
-                data['Alert Level'] = data['json_data'].apply(lambda x: extract_levels(x, 'Alert Level'))
-                data['Severity'] = data['json_data'].apply(lambda x: extract_levels(x, 'Severity'))
-
-                farms = filter_farms(data)
+                farms = farm_index.options('farmName')
                 selected_farm = st.sidebar.selectbox("Select Farm", farms)
 
-                alert_levels = ['Select All'] + list(data['Alert Level'].dropna().unique())
+                alert_levels = [SELECT_ALL] + farm_index.options('Alert Level')
                 selected_alert_level = st.sidebar.selectbox("Alert Level", alert_levels)
 
-                severity_levels = ['Select All'] + list(data['Severity'].dropna().unique())
+                severity_levels = [SELECT_ALL] + farm_index.options('Severity')
                 selected_severity = st.sidebar.selectbox("Severity", severity_levels)
 
+                date_range = st.sidebar.date_input("Select Date Range", [])
+
                 if selected_farm:
-                    if selected_alert_level == 'Select All' and selected_severity == 'Select All':
-                        filtered_data = data[data['farmName'] == selected_farm]
-                    elif selected_alert_level == 'Select All':
-                        filtered_data = data[(data['farmName'] == selected_farm) & (data['Severity'] == selected_severity)]
-                    elif selected_severity == 'Select All':
-                        filtered_data = data[(data['farmName'] == selected_farm) & (data['Alert Level'] == selected_alert_level)]
-                    else:
-                        filtered_data = data[(data['farmName'] == selected_farm) &
-                                         (data['Alert Level'] == selected_alert_level) &
-                                         (data['Severity'] == selected_severity)]
+                    ranges = {}
+                    if date_range and len(date_range) == 2:
+                        ranges['Record Date'] = (pd.Timestamp(date_range[0]).to_datetime64(),
+                                                 pd.Timestamp(date_range[1]).to_datetime64())
+                    positions = farm_index.query({'farmName': selected_farm,
+                                                  'Alert Level': selected_alert_level,
+                                                  'Severity': selected_severity}, ranges)
+                    filtered_data = farm_index.take(positions)
                 
                     display_farm_info(filtered_data, selected_farm)
 
     # Activity Status Dashboard
     elif selected_dashboard == 'Activity Status':
         st.title("Activity Status Dashboard")
-        uploaded_file_activity = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/activity_avinbev.csv"
+        uploaded_file_activity = data_loader.dataset_path('activity')
         if uploaded_file_activity is not None:
-            # Read the CSV file
-            df_activity = pd.read_csv(uploaded_file_activity)
-            # Replace NaN values with an empty string
-            df_activity = df_activity.fillna('')
-            # Apply the color mapping
-            styled_df = df_activity.style.applymap(color_mapping)
-            # Apply special styling for "FarmName" column
-            if 'FarmName' in df_activity.columns:
-                styled_df = styled_df.applymap(farmname_color_mapping, subset=['FarmName'])
-            styled_df = styled_df.set_table_styles(
-                [{
-                    'selector': 'th',
-                    'props': [('background-color', '#333'), ('color', 'white')]
-                }, {
-                    'selector': 'td',
-                    'props': [('border', '1px solid #ddd'), ('padding', '8px')]
-                }]
-            ).set_properties(
-                **{
-                    'font-size': '15px',
-                    'font-family': 'Arial',
-                    'border': '1px solid #ddd'
-                }
-            )
-            # Display the styled dataframe
-            st.write(styled_df.to_html(escape=False), unsafe_allow_html=True)
-            st.markdown("""<style>
-                th:first-child {position: sticky; left: 0; background-color: #f1f1f1;}
-                td:first-child {position: sticky; left: 0; background-color: #f1f1f1;}
-                tr:first-child th {position: sticky; top: 0; background-color: #f1f1f1;}
-                </style>""", unsafe_allow_html=True)
+            precomputed = precomputed_tracker('activity', uploaded_file_activity, load_activity_table)
+            # Display the table, cells are colored through the shared stylesheet
+            show_paged_table('activity', lambda: load_activity_table(uploaded_file_activity),
+                             table_renderer.render_activity_status, precomputed=precomputed)
         else:
             st.write("Please upload a CSV file for the Activity Status dashboard.")
 
     # Growth Tracker Dashboard
     elif selected_dashboard == 'Growth Tracker':
         st.title("Growth Tracker Dashboard")
-        uploaded_file_growth = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/Growth_Tracker.csv"
+        uploaded_file_growth = data_loader.dataset_path('growth')
         if uploaded_file_growth is not None:
-            # Read the CSV file
-            df_growth = pd.read_csv(uploaded_file_growth)
-            # Replace NaN values with an empty string
-            df_growth = df_growth.fillna('')
-            # Apply the growth tracker color mapping
-            styled_df_growth = df_growth.style.applymap(lambda val: growth_tracker_color_mapping(val))
-            for column in df_growth.columns:
-                if column == 'Farm Name':
-                    styled_df_growth.set_properties(**{'color': 'grey'}, subset=pd.IndexSlice[:, column])
-            # Set custom table styles
-            styled_df_growth = styled_df_growth.set_table_styles(
-                [{
-                    'selector': 'th',
-                    'props': [('background-color', '#333'), ('color', 'white')]
-                }, {
-                    'selector': 'td',
-                    'props': [('border', '1px solid #ddd'), ('padding', '8px')]
-                }]
-            ).set_properties(
-                **{
-                    'font-size': '15px',
-                    'font-family': 'Arial',
-                    'border': '1px solid #ddd'
-                }
-            )
-            # Display the styled dataframe
-            st.write(styled_df_growth.to_html(), unsafe_allow_html=True)
-            st.markdown("""<style>
-                th:first-child {position: sticky; left: 0; background-color: #f1f1f1;}
-                td:first-child {position: sticky; left: 0; background-color: #f1f1f1;}
-                tr:first-child th {position: sticky; top: 0; background-color: #f1f1f1;}
-                </style>""", unsafe_allow_html=True)
+            precomputed = precomputed_tracker('growth', uploaded_file_growth, load_growth_table)
+            # Farms can be narrowed down to those currently at one stage
+            if precomputed is not None:
+                stages = precomputed['columns']
+            else:
+                stages = load_growth_table(uploaded_file_growth).columns
+            stage = st.selectbox("Farms currently at stage", ['All farms'] + [c for c in stages if c != 'Farm Name'],
+                                 key="growth_stage")
+            rows = None if stage == 'All farms' else load_stage_table(uploaded_file_growth).at_stage(stage)
+            # Display the table, cells are colored through the shared stylesheet
+            show_paged_table('growth', lambda: load_growth_table(uploaded_file_growth),
+                             table_renderer.render_growth_tracker, precomputed=precomputed, rows=rows)
         else:
             st.write("Please upload a CSV file for the Growth Tracker dashboard.")
 
     elif selected_dashboard == 'Operations Tracker':
         st.title("Operations Tracker Dashboard")
-        uploaded_file_operations = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main/operations.csv"
+        uploaded_file_operations = data_loader.dataset_path('operations')
         if uploaded_file_operations is not None:
-        # Read the CSV file
-            df_operations = pd.read_csv(uploaded_file_operations)
-        # Replace NaN values with an empty string or any other suitable method
-            df_operations = df_operations.fillna('')
-            df_operations = df_operations.astype(str)
-        # Convert specific columns to numeric type
-            decimal_columns = ['Seeding Rate', 'DAP/MOP Fertilizer Applied quantity', 'UREA1 Fertilizer Applied quantity']
-            df_operations[decimal_columns] = df_operations[decimal_columns].apply(pd.to_numeric, errors='coerce')
-        # Round the specified columns to 2 decimal places
-            df_operations[decimal_columns] = df_operations[decimal_columns].round(2)
-        # Apply the conditional color mapping
-            styled_df_operations = df_operations.style.apply(lambda x: [conditional_color_mapping(v, x.name) for v in x], subset=decimal_columns)
-        # Apply special styling for specific columns if needed
-            if 'Column_Name' in df_operations.columns:
-                styled_df_operations = styled_df_operations.applymap(custom_color_mapping, subset=['Column_Name'])
-        # Set custom table styles
-            styled_df_operations = styled_df_operations.set_table_styles(
-                [{
-                    'selector': 'th',
-                    'props': [('background-color', '#333'), ('color', 'white')]
-                }, {
-                    'selector': 'td',
-                    'props': [('border', '1px solid #ddd'), ('padding', '8px')]
-                }]
-            ).set_properties(
-                **{
-                    'font-size': '15px',
-                    'font-family': 'Arial',
-                    'border': '1px solid #ddd'
-                }
-            )
-        # Display the styled dataframe
-            st.write(styled_df_operations.to_html(), unsafe_allow_html=True)
-            st.markdown("""<style>
-                th:first-child {position: sticky; left: 0; background-color: #f1f1f1;}
-                td:first-child {position: sticky; left: 0; background-color: #f1f1f1;}
-                tr:first-child th {position: sticky; top: 0; background-color: #f1f1f1;}
-                </style>""", unsafe_allow_html=True)
+            precomputed = precomputed_tracker('operations', uploaded_file_operations, load_operations_table)
+            # Display the table, out of band values are colored through the shared stylesheet
+            show_paged_table('operations', lambda: load_operations_table(uploaded_file_operations),
+                             table_renderer.render_operations_tracker, precomputed=precomputed)
+            if precomputed is not None and 'compliance' in precomputed:
+                show_compliance(precomputed['compliance'])
+            else:
+                show_compliance(load_compliance(uploaded_file_operations))
         else:
             st.write("Please upload a CSV file for the Operations Tracker dashboard.")
+
+    if profile_reruns:
+        show_profile_panel(profiling.finish())
@@ -0,0 +1,216 @@
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+# Registers the 'streamlit' plotly template, the app's default
+import streamlit.elements.lib.streamlit_plotly_theme
+
+import charts
+import dashboard_data
+import farm_snapshot
+import ingest
+import schemas
+import synthetic
+import table_pager
+import table_renderer
+
+
+SCALES = [1, 10, 100]
+REPEAT = 3
+BASELINE = 'benchmark_baseline.json'
+# A stage regresses when its time or peak memory exceeds the baseline by more than this
+TOLERANCE = 0.25
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.005
+MIN_PEAK_MB = 1.0
+
+# Figures are built with the template the app would build them with
+pio.templates.default = 'streamlit'
+
+
+def _typed(paths, name):
+    return schemas.apply_schema(pd.read_csv(paths[name], dtype=str), name)
+
+
+def _ingest(paths):
+    store = tempfile.mkdtemp(prefix='bench-store-')
+    try:
+        return ingest.read_store(store, ingest.ingest(paths['visits'], store))
+    finally:
+        shutil.rmtree(store, ignore_errors=True)
+
+
+def _activity_chart(data):
+    activity_over_time = charts.ActivityCube(data).activity_over_time()
+    return px.line(activity_over_time, x='Date', y='Counts', color='Activity',
+                   title='Activity Occurrences Over Time').to_json()
+
+
+def _gantt(data):
+    gantt_data = dashboard_data.generate_gantt_data(data)
+    return charts.gantt_figure(gantt_data, 'Gantt Chart of Activities').to_json()
+
+
+def _farm_filter(flat):
+    farm_index = dashboard_data.build_farm_filter_index(flat)
+    farm = farm_index.options('farmName')[0]
+    return farm_index.take(farm_index.query({'farmName': farm}))
+
+
+def _tracker(table, kind):
+    # What a tracker dashboard does per view: index, one search and sort, render the first page.
+    # Rendered directly, the dashboards' render cache would turn every timed run into a hit.
+    classes, escape = table_renderer.TRACKERS[kind]
+    index = table_pager.TableIndex(table)
+    page = index.rows(index.query('a', index.columns[-1])[:50])
+    return table_renderer.render_html(page, classes(page), escape=escape)
+
+
+# Stage name -> (prepare(paths) -> argument, run(argument)). prepare is not timed.
+STAGES = {
+    'visits: parse': (lambda paths: paths, lambda paths: _typed(paths, 'visits')),
+    'visits: ingest': (lambda paths: paths, _ingest),
+    'visits: summary': (lambda paths: _typed(paths, 'visits'), dashboard_data.generate_summary),
+    'visits: activity chart': (lambda paths: _typed(paths, 'visits'), _activity_chart),
+    'visits: gantt': (lambda paths: _typed(paths, 'visits'), _gantt),
+    'farm_info: flatten': (lambda paths: pd.read_csv(paths['farm_info'], dtype=str),
+                           farm_snapshot.flatten_json_column),
+    'farm_info: filter index': (
+        lambda paths: schemas.apply_schema(
+            farm_snapshot.flatten_json_column(pd.read_csv(paths['farm_info'], dtype=str)), 'farm_info'),
+        _farm_filter),
+    'activity: table': (lambda paths: schemas.fill_blank(_typed(paths, 'activity')),
+                        lambda table: _tracker(table, 'activity')),
+    'growth: table': (lambda paths: schemas.fill_blank(_typed(paths, 'growth')),
+                      lambda table: _tracker(table, 'growth')),
+    'operations: table': (lambda paths: dashboard_data.prepare_operations(_typed(paths, 'operations')),
+                          lambda table: _tracker(table, 'operations')),
+}
+
+
+def measure(run, argument, repeat=REPEAT):
+    # Best wall time of repeat runs, then one run under tracemalloc for the
+    # peak memory and the allocations still held when the stage returns.
+    # An untimed first run takes lazy imports and first-call caches out.
+    run(argument)
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = run(argument)
+        seconds.append(time.perf_counter() - started)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        result = run(argument)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    held = after.compare_to(before, 'filename')
+    del result
+    return {
+        'seconds': min(seconds),
+        'peak_mb': peak / 2 ** 20,
+        'alloc_blocks': sum(stat.count_diff for stat in held if stat.count_diff > 0),
+        'alloc_mb': sum(stat.size_diff for stat in held if stat.size_diff > 0) / 2 ** 20,
+    }
+
+
+def run_benchmarks(scales=SCALES, stages=None, repeat=REPEAT, data_dir=None, work_dir=None, report=print):
+    stages = list(STAGES) if not stages else stages
+    results = []
+    work_dir = tempfile.mkdtemp(prefix='bench-data-') if work_dir is None else work_dir
+    try:
+        for scale in scales:
+            paths = synthetic.write_datasets(os.path.join(work_dir, f"x{scale}"), scale, data_dir)
+            for stage in stages:
+                prepare, run = STAGES[stage]
+                result = dict(stage=stage, scale=scale, **measure(run, prepare(paths), repeat))
+                results.append(result)
+                if report is not None:
+                    report(format_result(result))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def format_result(result, note=''):
+    return (f"{result['stage']:<26} x{result['scale']:<5} {result['seconds'] * 1000:>10.1f} ms "
+            f"{result['peak_mb']:>9.1f} MB peak {result['alloc_blocks']:>9} blocks "
+            f"{result['alloc_mb']:>8.1f} MB held{note}")
+
+
+def _key(result):
+    return f"{result['stage']} x{result['scale']}"
+
+
+def read_baseline(path):
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_baseline(path, results):
+    baseline = read_baseline(path)
+    baseline.update({_key(result): result for result in results})
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+
+
+def regressions(results, baseline, tolerance=TOLERANCE):
+    # (result, reason) for every stage slower or hungrier than its baseline
+    found = []
+    for result in results:
+        reference = baseline.get(_key(result))
+        if reference is None:
+            continue
+        if (result['seconds'] - reference['seconds'] > MIN_SECONDS
+                and result['seconds'] > reference['seconds'] * (1 + tolerance)):
+            found.append((result, f"time {reference['seconds'] * 1000:.1f} -> {result['seconds'] * 1000:.1f} ms"))
+        if (result['peak_mb'] - reference['peak_mb'] > MIN_PEAK_MB
+                and result['peak_mb'] > reference['peak_mb'] * (1 + tolerance)):
+            found.append((result, f"peak {reference['peak_mb']:.1f} -> {result['peak_mb']:.1f} MB"))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the dashboards' data preparation and rendering on synthetic data, headless.")
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES,
+                        help="sizes relative to the shipped CSVs (default: %(default)s, 1000 is available too)")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), metavar='STAGE',
+                        help="stages to run (default: all): " + ', '.join(STAGES))
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="timed runs per stage, the best counts")
+    parser.add_argument('--data-dir', default=None, help="directory or URL of the template CSVs (default: DATA_DIR)")
+    parser.add_argument('--baseline', default=BASELINE, help="baseline file (default: %(default)s)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales, args.stages, args.repeat, args.data_dir)
+    if args.save_baseline:
+        write_baseline(args.baseline, results)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    found = regressions(results, read_baseline(args.baseline), args.tolerance)
+    for result, reason in found:
+        print(f"REGRESSION {_key(result)}: {reason}")
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
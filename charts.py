@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import plotly.colors
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+import data_loader
+import profiling
+
+
+FIGURE_CACHE_ENTRIES = 64
+
+# Above this many bars the Gantt chart is bucketed by week, then by month
+GANTT_MAX_BARS = 2000
+GANTT_RESOLUTIONS = ['Auto', 'Visit', 'Week', 'Month']
+GANTT_BUCKETS = {'Week': 'W', 'Month': 'M'}
+# Farms get legend entries up to this many, beyond that only hover names them
+GANTT_LEGEND_FARMS = 30
+
+
+# Serialized Plotly figures keyed on (chart, dataset version, filter state),
+# least recently used dropped. Figures are stored as JSON so a hit never
+# shares a mutable figure object between sessions.
+_figures = data_loader.DataCache(ttl=float('inf'), max_entries=FIGURE_CACHE_ENTRIES)
+
+
+def get_figure_cache():
+    return _figures
+
+
+def cached_figure(key, build):
+    def build_json():
+        with profiling.stage(f"build figure {key[0] if isinstance(key, tuple) else key}"):
+            return build().to_json()
+    return pio.from_json(_figures.get(key, build_json))
+
+
+class ActivityCube:
+    # Activity counts pre-aggregated into a day x activity x seed variety
+    # array. Date range and variety filters become slices and sums over the
+    # array instead of a fresh groupby over the visit log.
+    def __init__(self, data):
+        days = pd.to_datetime(data['Date']).dt.normalize()
+        valid = (days.notna() & data['Activity'].notna()).to_numpy()
+        day_codes, self.days = pd.factorize(days[valid], sort=True)
+        activity_codes, self.activities = pd.factorize(data['Activity'][valid], sort=True)
+        if 'Seed Variety' in data.columns:
+            variety_codes, self.varieties = pd.factorize(data['Seed Variety'][valid], sort=True)
+        else:
+            variety_codes, self.varieties = np.full(int(valid.sum()), -1), pd.Index([])
+        # Rows without a variety get the last slot
+        variety_codes = np.where(variety_codes < 0, len(self.varieties), variety_codes)
+
+        shape = (len(self.days), len(self.activities), len(self.varieties) + 1)
+        cells = np.ravel_multi_index((day_codes, activity_codes, variety_codes), shape)
+        self.counts = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape).astype(np.int32)
+        self.day_values = np.asarray(self.days, dtype='datetime64[ns]')
+
+    def _day_slice(self, start, end):
+        lo = 0 if start is None else np.searchsorted(self.day_values, pd.Timestamp(start).to_datetime64(), 'left')
+        hi = len(self.day_values) if end is None else np.searchsorted(
+            self.day_values, pd.Timestamp(end).to_datetime64(), 'right')
+        return slice(lo, max(lo, hi))
+
+    def matrix(self, start=None, end=None, varieties=None):
+        # day x activity counts for the inclusive day range and the given varieties
+        days = self._day_slice(start, end)
+        counts = self.counts[days]
+        if varieties:
+            wanted = [i for i, v in enumerate(self.varieties) if v in set(varieties)]
+            counts = counts[:, :, wanted]
+        return counts.sum(axis=2), self.days[days]
+
+    def activity_over_time(self, start=None, end=None, varieties=None):
+        # Same rows as data.groupby(['Date', 'Activity']).size(), zero cells left out
+        matrix, days = self.matrix(start, end, varieties)
+        day_index, activity_index = np.nonzero(matrix)
+        return pd.DataFrame({
+            'Date': days[day_index],
+            'Activity': np.asarray(self.activities, dtype=object)[activity_index],
+            'Counts': matrix[day_index, activity_index],
+        })
+
+
+def gantt_segments(data, date_column='Date', task_column='Activity', resource_column='FarmName'):
+    # One bar per activity, running from its visit to the farm's next visit
+    # day. Activities on a farm's last visit day are shown as one day long.
+    days = pd.to_datetime(data[date_column]).dt.normalize()
+    valid = (days.notna() & data[task_column].notna() & data[resource_column].notna()).to_numpy()
+    farm_codes, farms = pd.factorize(data[resource_column][valid])
+    day_codes, day_values = pd.factorize(days[valid], sort=True)
+    day_values = np.append(np.asarray(day_values, dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+
+    # Distinct (farm, day) visits in farm then day order, each row points at its visit
+    visits, visit_of_row = np.unique(farm_codes * len(day_values) + day_codes, return_inverse=True)
+    visit_farms, visit_days = np.divmod(visits, len(day_values))
+    next_days = day_values[np.append(visit_days[1:], -1)]
+    last_visit = np.append(visit_farms[1:] != visit_farms[:-1], True)
+    next_days[last_visit] = day_values[visit_days[last_visit]] + np.timedelta64(1, 'D')
+
+    return pd.DataFrame({
+        'Start': day_values[day_codes],
+        'Finish': next_days[visit_of_row],
+        'Task': data[task_column][valid].astype(object).to_numpy(),
+        'Resource': np.asarray(farms, dtype=object)[farm_codes],
+        'Visits': np.ones(len(farm_codes), dtype=np.int32),
+    })
+
+
+def bucket_segments(segments, freq):
+    # Merges a task's bars on the same farm within each week or month
+    bucket = segments['Start'].dt.to_period(freq).dt.start_time
+    grouped = segments.groupby([segments['Resource'], segments['Task'], bucket], sort=False)
+    merged = grouped.agg(Start=('Start', 'min'), Finish=('Finish', 'max'), Visits=('Visits', 'sum'))
+    return merged.reset_index(level=['Resource', 'Task']).reset_index(drop=True)
+
+
+def gantt_resolution(rows, resolution='Auto'):
+    if resolution != 'Auto':
+        return resolution
+    return 'Visit' if rows <= GANTT_MAX_BARS else 'Week' if rows <= GANTT_MAX_BARS * 7 else 'Month'
+
+
+def gantt_figure(segments, title, resolution='Auto'):
+    # A single horizontal bar trace: every bar is a row of the arrays below,
+    # so the figure stays one trace no matter how many activities it shows
+    resolution = gantt_resolution(len(segments), resolution)
+    if resolution in GANTT_BUCKETS:
+        segments = bucket_segments(segments, GANTT_BUCKETS[resolution])
+    farm_codes, farms = pd.factorize(segments['Resource'])
+    palette = np.asarray(plotly.colors.qualitative.Plotly, dtype=object)
+    durations = (segments['Finish'] - segments['Start']).dt.total_seconds().to_numpy() * 1000
+
+    fig = go.Figure(go.Bar(
+        base=segments['Start'].dt.strftime('%Y-%m-%d').to_numpy(),
+        x=durations,
+        y=segments['Task'].to_numpy(),
+        orientation='h',
+        marker=dict(color=palette[farm_codes % len(palette)]),
+        customdata=np.stack([segments['Resource'].to_numpy(),
+                             segments['Finish'].dt.strftime('%Y-%m-%d').to_numpy(),
+                             segments['Visits'].to_numpy()], axis=1),
+        hovertemplate='%{y}<br>%{customdata[0]}<br>%{base} to %{customdata[1]}'
+                      '<br>%{customdata[2]} record(s)<extra></extra>',
+        showlegend=False,
+    ))
+    if len(farms) <= GANTT_LEGEND_FARMS:
+        # Legend entries only, one per farm
+        fig.add_traces([go.Scatter(x=[None], y=[None], mode='markers', name=str(farm),
+                                   marker=dict(color=palette[code % len(palette)]))
+                        for code, farm in enumerate(farms)])
+    fig.update_layout(title=title if resolution == 'Visit' else '%s (by %s)' % (title, resolution.lower()),
+                      barmode='overlay', xaxis=dict(type='date', showgrid=True), yaxis=dict(showgrid=True))
+    return fig
+
+
+# Growth stage status -> bar color, as in the Growth Tracker table
+STAGE_COLORS = {'well and passed': 'green', 'current': 'yellow', 'not followed': 'red', 'blank': 'lightgrey'}
+
+
+def stage_distribution_figure(distribution, title):
+    # Stacked bars of farms per stage and status, from StageTable.distribution()
+    distribution = distribution[distribution['Farms'] > 0]
+    return px.bar(distribution, x='Stage', y='Farms', color='Status', title=title,
+                  color_discrete_map=STAGE_COLORS, category_orders={'Status': list(STAGE_COLORS)})
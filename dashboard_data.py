@@ -0,0 +1,164 @@
+from datetime import timedelta
+
+import pandas as pd
+import plotly.express as px
+
+import charts
+import data_loader
+import farm_snapshot
+import growth_stages
+import profiling
+import schemas
+import table_pager
+import thresholds
+from farm_query import FilterIndex
+from metrics_store import MetricsStore
+from visit_index import DailyVisitIndex, aggregate_visits
+
+
+# Tables, summaries and figures behind the dashboards. Nothing here touches
+# Streamlit, so the app, the precompute worker and the benchmark share it.
+
+
+# Farm information filters
+FARM_FILTER_COLUMNS = ['farmName', 'Alert Level', 'Severity', 'activity_record']
+
+
+def build_farm_filter_index(data):
+    if 'json_ok' in data.columns:
+        data = data[data['json_ok']]
+    if 'Date' in data.columns:
+        data = data.assign(**{'Record Date': farm_snapshot.parse_record_dates(data['Date'])})
+    range_columns = ['Record Date'] if 'Record Date' in data.columns else []
+    return FilterIndex(data, FARM_FILTER_COLUMNS, range_columns)
+
+
+@profiling.timed('summary')
+def generate_summary(data, visit_index=None, metrics=None):
+    # Daily visit counts come from a per-day index, pass one in to reuse it
+    if visit_index is None:
+        visit_index = DailyVisitIndex(data)
+    # KPIs come from a metrics store, by default one built from this frame only
+    if metrics is None:
+        metrics = MetricsStore().sync(visits=data).metrics()
+    today = pd.Timestamp.now().normalize()
+    total_visited_today = visit_index.visited_on(today)
+    total_visited_yesterday = visit_index.visited_on(today - timedelta(days=1))
+    total_visited_two_days_ago = visit_index.visited_on(today - timedelta(days=2))
+    # Other summary calculations
+    totals = aggregate_visits(data)
+    activities_summary = totals['activities_summary']
+    seed_varieties = totals['seed_varieties']
+    num_irrigation_done = totals['num_irrigation_done']
+    num_sprinkler_installed = totals['num_sprinkler_installed']
+    # Create summary data dictionary
+    summary_data = dict(metrics)
+    summary_data.update({
+        'Irrigation Done': num_irrigation_done,
+        'Sprinkler Installed': num_sprinkler_installed,
+        'Total Plot Visited Today': total_visited_today,
+        'Total Plot Visited Yesterday': total_visited_yesterday,
+        'Total Plot Visited Two Days Ago': total_visited_two_days_ago,
+        'Activity Details Last Date': activities_summary
+    })
+    # Create summary DataFrame
+    summary_df = pd.DataFrame(list(summary_data.items()), columns=['Metric', 'Value'])
+    # Return summary DataFrame along with other calculated values
+    return summary_df, activities_summary, seed_varieties
+
+def generate_fertilizer_usage(data):
+    fertilizer_usage = data[['Farm Name', 'DAP/MOP Fertilizer Applied quantity', 'UREA1 Fertilizer Applied quantity']]
+    return fertilizer_usage
+
+# Function to generate seed usage summary
+def generate_seed_usage(data):
+    seed_usage = data[['Farm Name', 'Seeding Rate']]
+    return seed_usage
+
+
+def build_usage_figure(usage, column, title):
+    # The dashed line is the column's target from the threshold rules
+    fig = px.bar(usage, x='Farm Name', y=column, title=title)
+    reference = thresholds.reference(column)
+    fig.add_shape(
+        type='line',
+        x0=-0.5, x1=len(usage['Farm Name']) - 0.5,
+        y0=reference, y1=reference,
+        line=dict(color='white', dash='dash')
+    )
+    return fig
+
+
+def macro_figure_builders(operations, activity_cube, stage_table, start=None, end=None, varieties=()):
+    # Macro View figures by name, shared with the precompute worker
+    return {
+        'dap_mop': lambda: build_usage_figure(generate_fertilizer_usage(operations),
+                                              'DAP/MOP Fertilizer Applied quantity',
+                                              'DAP/MOP Fertilizer Applied Quantity (KG/Bigha) by Farm'),
+        'urea1': lambda: build_usage_figure(generate_fertilizer_usage(operations), 'UREA1 Fertilizer Applied quantity',
+                                            'UREA1 Fertilizer Applied Quantity (KG/Bigha) by Farm'),
+        'seed_usage': lambda: build_usage_figure(generate_seed_usage(operations), 'Seeding Rate',
+                                                 'Seed Usage (KG/Bigha) by Farm'),
+        'stage_distribution': lambda: charts.stage_distribution_figure(stage_table.distribution(),
+                                                                       'Farms by Growth Stage'),
+        'activity_over_time': lambda: px.line(activity_cube.activity_over_time(start, end, list(varieties)),
+                                              x='Date', y='Counts', color='Activity',
+                                              title='Activity Occurrences Over Time'),
+    }
+
+
+@profiling.timed('gantt segments')
+def generate_gantt_data(data):
+    # Each activity lasts until the farm's next visit
+    gantt_data = charts.gantt_segments(data)
+    return gantt_data
+
+
+def prepare_operations(df_operations):
+    # Replace NaN values in text columns with an empty string, numbers are typed by the schema
+    df_operations = schemas.fill_blank(df_operations)
+    decimal_columns = ['Seeding Rate', 'DAP/MOP Fertilizer Applied quantity', 'UREA1 Fertilizer Applied quantity']
+    # Round the specified columns to 2 decimal places
+    df_operations[decimal_columns] = df_operations[decimal_columns].round(2)
+    return df_operations
+
+
+# Loaders shared by the dashboards and the startup warm-up, each builds on the cached frame of its CSV
+@profiling.timed('load table')
+def load_activity_table(source):
+    # NaN values replaced with an empty string, indexed once per version
+    return data_loader.derived(source, 'activity_table', lambda df: table_pager.TableIndex(schemas.fill_blank(df)),
+                               schema='activity')
+
+
+def load_stage_table(source):
+    # Stage status and value per farm, parsed once per version
+    return data_loader.derived(source, 'stage_table', growth_stages.parse, schema='growth')
+
+
+@profiling.timed('load table')
+def load_growth_table(source):
+    # Stage columns sort by progress (status, then value) rather than by text
+    sort_keys = load_stage_table(source).sort_keys()
+    return data_loader.derived(source, 'growth_table',
+                               lambda df: table_pager.TableIndex(schemas.fill_blank(df), sort_keys=sort_keys),
+                               schema='growth')
+
+
+@profiling.timed('load table')
+def load_operations_table(source):
+    return data_loader.derived(source, 'operations_table', lambda df: table_pager.TableIndex(prepare_operations(df)),
+                               schema='operations')
+
+
+def load_compliance(source):
+    # Per-farm threshold check over the same rounded values the table shows
+    return data_loader.derived(source, 'compliance', lambda df: thresholds.compliance(prepare_operations(df)),
+                               schema='operations')
+
+
+@profiling.timed('farm filter index')
+def load_farm_index(source):
+    # JSON fields come pre-flattened into columns from the local snapshot,
+    # indexed once per snapshot version for the sidebar filters
+    return farm_snapshot.derived(source, 'filter_index', build_farm_filter_index)
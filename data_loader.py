@@ -0,0 +1,243 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import http_source
+import profiling
+import schemas
+
+
+# Where the dashboards read their CSVs from. Set ABINBEV_DATA_DIR to a local
+# directory holding the same files to run the app (or tests) offline, or to
+# the base URL of another server, e.g. a local stand-in.
+BASE_URL = "https://raw.githubusercontent.com/sakshamraj4/abinbev/main"
+DATA_DIR = os.environ.get("ABINBEV_DATA_DIR", "")
+# Local directory for pre-parsed snapshots derived from the CSVs
+SNAPSHOT_DIR = os.environ.get("ABINBEV_SNAPSHOT_DIR", ".snapshots")
+
+# Seconds a loaded frame is served from memory before the source is checked again
+CACHE_TTL = float(os.environ.get("ABINBEV_CACHE_TTL", "600"))
+# Number of frames kept in memory, least recently used ones are dropped first
+CACHE_MAX_ENTRIES = int(os.environ.get("ABINBEV_CACHE_MAX_ENTRIES", "16"))
+
+# Dataset name -> file name, one per dashboard source
+DATASETS = {
+    'visits': 'data.csv',
+    'operations': 'operations.csv',
+    'farm_info': 'test1.csv',
+    'activity': 'activity_avinbev.csv',
+    'growth': 'Growth_Tracker.csv',
+}
+
+
+def is_url(source):
+    return str(source).startswith(('http://', 'https://'))
+
+
+def write_atomic(target, write):
+    # write(path) fills a temporary file next to target, which then replaces
+    # target in one step so readers never see a partly written file
+    tmp = f"{target}.tmp"
+    write(tmp)
+    os.replace(tmp, target)
+
+
+def dataset_path(name, data_dir=None):
+    file_name = DATASETS[name]
+    data_dir = DATA_DIR if data_dir is None else data_dir
+    if data_dir:
+        return os.path.join(data_dir, file_name)
+    return f"{BASE_URL}/{file_name}"
+
+
+def source_tag(source):
+    # Cheap version marker for a source: mtime/size for local files,
+    # ETag (or Last-Modified) through the HTTP source for URLs
+    if not is_url(source):
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+    with profiling.stage('source check'):
+        return http_source.get_source().tag(source)
+
+
+class DataCache:
+    # Memoizes loaded frames per key with a TTL and LRU eviction.
+    # Entries remember the source tag they were loaded with, so an expired
+    # entry whose source did not change is renewed instead of reloaded.
+    # With an infinite ttl and no tag_func it is a plain LRU memo, which is
+    # how the figure and render caches use it.
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, tag_func=None, check_on_hit=False):
+        with self._lock:
+            entry = self._entries.get(key)
+        current_tag = None
+        if entry is not None:
+            tag, expires, value = entry
+            fresh = time.monotonic() < expires
+            if fresh and (not check_on_hit or tag_func is None):
+                return self._hit(key, value)
+            current_tag = tag_func() if tag_func else None
+            if current_tag is not None and current_tag == tag:
+                if not fresh:
+                    self._store(key, tag, value)
+                return self._hit(key, value)
+        elif tag_func is not None:
+            current_tag = tag_func()
+
+        value = loader()
+        with self._lock:
+            self.misses += 1
+        self._store(key, current_tag, value)
+        return value
+
+    def _hit(self, key, value):
+        with self._lock:
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, tag, value):
+        with self._lock:
+            self._entries[key] = (tag, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = DataCache()
+
+
+def get_cache():
+    return _cache
+
+
+def clear_cache():
+    _cache.invalidate()
+    with _derived_lock:
+        _derived.clear()
+
+
+def _parse_csv(source, **kwargs):
+    # URLs are streamed from the HTTP source straight into the parser
+    with profiling.stage('read_csv'):
+        if is_url(source):
+            return http_source.get_source().read(source, lambda stream: pd.read_csv(stream, **kwargs))
+        return pd.read_csv(source, **kwargs)
+
+
+def local_copy(source):
+    # Path of an up to date local copy of a source, for readers that need a file
+    if not is_url(source):
+        return source
+    with profiling.stage('fetch'):
+        http_source.get_source().download(source)
+    return http_source.get_source().mirror_path(source)
+
+
+def _read_csv(source, date_column=None, dayfirst=True, schema=None):
+    # With a schema name the columns are typed as declared in schemas.SCHEMAS
+    if schema is not None:
+        return schemas.apply_schema(_parse_csv(source, dtype=str), schema)
+    data = _parse_csv(source)
+    if date_column is not None and date_column in data.columns:
+        with profiling.stage('parse dates'):
+            data[date_column] = pd.to_datetime(data[date_column], dayfirst=dayfirst, errors='coerce')
+    return data
+
+
+def _cached_frame(source, date_column=None, dayfirst=True, schema=None):
+    source = str(source)
+    return _cache.get(
+        (source, date_column, dayfirst, schema),
+        lambda: _read_csv(source, date_column, dayfirst, schema),
+        tag_func=lambda: source_tag(source),
+        # stat() is cheap enough to run on every hit, a HEAD request is not
+        check_on_hit=not is_url(source),
+    )
+
+
+def read_csv_cached(source, date_column=None, dayfirst=True, schema=None):
+    # Callers get their own copy so column assignments on the frame
+    # do not leak back into the cached one
+    return _cached_frame(source, date_column, dayfirst, schema).copy()
+
+
+# key -> (frame it was built from, value)
+_derived = {}
+_derived_lock = threading.Lock()
+
+
+def derive(frame, key, build):
+    # Memoizes build(frame) under key for as long as the same frame object
+    # is passed in. build must not modify the frame it is given.
+    with _derived_lock:
+        entry = _derived.get(key)
+    if entry is not None and entry[0] is frame:
+        return entry[1]
+    value = build(frame)
+    with _derived_lock:
+        _derived[key] = (frame, value)
+    return value
+
+
+def derived(source, name, build, date_column=None, dayfirst=True, schema=None):
+    # Memoizes build(frame) for the cached frame of a source. The value is
+    # rebuilt only when the frame itself was reloaded, so indexes and
+    # aggregates stay in step with the data they describe.
+    frame = _cached_frame(source, date_column, dayfirst, schema)
+    return derive(frame, (str(source), date_column, dayfirst, schema, name), build)
+
+
+_versions = itertools.count(1)
+
+
+def new_version(frame=None):
+    # Process-wide increasing number, used through derived() to tag each
+    # loaded frame with a version that downstream caches can key on
+    return next(_versions)
+
+
+def read_dataset(name, data_dir=None):
+    return read_csv_cached(dataset_path(name, data_dir), schema=name)
+
+
+def prefetch(names=None, data_dir=None):
+    # Brings the local copies of the URL datasets up to date, all at once.
+    # Loads that follow read those copies instead of asking the server again.
+    sources = [dataset_path(name, data_dir) for name in (names or DATASETS)]
+    urls = [source for source in sources if is_url(source)]
+    return http_source.get_source().sync(urls) if urls else {}
+
+
+def offline_datasets(data_dir=None):
+    # Datasets currently served from their local copy because the server was unreachable
+    offline = set(http_source.get_source().offline())
+    return [name for name in DATASETS if dataset_path(name, data_dir) in offline]
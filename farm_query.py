@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+
+# Filter value meaning "no constraint on this column"
+SELECT_ALL = 'Select All'
+
+
+class FilterIndex:
+    # Category-coded index over a frame. For every equality column it keeps
+    # the code of each row plus a sorted posting list of row positions per
+    # value, and for every range column the row order by value with the
+    # values in that order. A query
+    # starts from the smallest candidate list and narrows it with code
+    # lookups, so its cost follows the result size rather than the frame.
+    def __init__(self, data, columns, range_columns=()):
+        self.data = data
+        self.codes = {}
+        self.categories = {}
+        self.postings = {}
+        for column in columns:
+            values = data[column] if column in data.columns else pd.Series([None] * len(data), index=data.index)
+            codes, categories = pd.factorize(values)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+            self.codes[column] = codes
+            self.categories[column] = categories
+            self.postings[column] = [order[bounds[i]:bounds[i + 1]] for i in range(len(categories))]
+        self.range_values = {}
+        self.range_orders = {}
+        self.range_sorted = {}
+        for column in range_columns:
+            values = data[column].to_numpy()
+            valid = np.flatnonzero(~pd.isna(values))
+            order = valid[np.argsort(values[valid], kind='stable')]
+            self.range_values[column] = values
+            self.range_orders[column] = order
+            self.range_sorted[column] = values[order]
+
+    def __len__(self):
+        return len(self.data)
+
+    def options(self, column):
+        return list(self.categories[column])
+
+    def _code(self, column, value):
+        return self.categories[column].get_indexer([value])[0]
+
+    def _equality_candidates(self, column, value):
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        lists = [self.postings[column][code] for code in (self._code(column, v) for v in values) if code >= 0]
+        if not lists:
+            return np.array([], dtype=np.intp)
+        return lists[0] if len(lists) == 1 else np.sort(np.concatenate(lists))
+
+    def _range_candidates(self, column, low, high):
+        # Binary search over the values sorted at build time, only the
+        # matching slice of the order is touched
+        order = self.range_orders[column]
+        sorted_values = self.range_sorted[column]
+        lo = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        hi = len(order) if high is None else np.searchsorted(sorted_values, high, side='right')
+        return np.sort(order[lo:hi])
+
+    def query(self, equals=None, ranges=None):
+        # equals: column -> value (or list of values), SELECT_ALL/None skips the column
+        # ranges: column -> (low, high), inclusive, None leaves that side open
+        # Returns row positions in frame order.
+        equals = {c: v for c, v in (equals or {}).items() if v is not None and v != SELECT_ALL}
+        ranges = {c: r for c, r in (ranges or {}).items() if r is not None}
+        candidates = [('eq', c, self._equality_candidates(c, v)) for c, v in equals.items()]
+        candidates += [('range', c, self._range_candidates(c, *r)) for c, r in ranges.items()]
+        if not candidates:
+            return np.arange(len(self.data))
+
+        candidates.sort(key=lambda item: len(item[2]))
+        positions = candidates[0][2]
+        for kind, column, _ in candidates[1:]:
+            if not len(positions):
+                break
+            if kind == 'eq':
+                value = equals[column]
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                # Unknown values code as -1, which is also the code of NaN rows
+                codes = [code for code in (self._code(column, v) for v in values) if code >= 0]
+                positions = positions[np.isin(self.codes[column][positions], codes)]
+            else:
+                low, high = ranges[column]
+                values = self.range_values[column][positions]
+                keep = ~pd.isna(values)
+                if low is not None:
+                    keep &= values >= low
+                if high is not None:
+                    keep &= values <= high
+                positions = positions[keep]
+        return positions
+
+    def take(self, positions):
+        return self.data.iloc[positions]
@@ -0,0 +1,163 @@
+import contextlib
+import glob
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import data_loader
+import json_flatten
+import schemas
+
+
+# Columns of test1.csv kept as-is next to the flattened JSON fields
+BASE_COLUMNS = ['id', 'activity_record', 'Image URL', 'farmName', 'json data', 'Date']
+
+# JSON field name -> type, fields not listed here are kept as stripped strings
+FIELD_TYPES = {
+    'Total Yield (quintal)': 'number',
+    'Visit Date': 'date',
+    'Application Date': 'date',
+    'Irrigation Date': 'date',
+    'Date': 'date',
+}
+
+# Parts are merged back into one file once there are more than this many
+MAX_PARTS = 16
+MANIFEST = 'manifest.json'
+# id and content hash of every source row the snapshot was built from
+ROW_INDEX = 'rows.parquet'
+
+
+def snapshot_path(source, snapshot_dir=None):
+    # One snapshot per source, so switching DATA_DIR never mixes two files
+    snapshot_dir = data_loader.SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+    return os.path.join(snapshot_dir, 'farm_info', hashlib.sha1(str(source).encode()).hexdigest()[:12])
+
+
+def field_column(name):
+    # JSON fields sharing a name with a CSV column (e.g. 'Date') get a suffix
+    return f"{name} (json)" if name in BASE_COLUMNS else name
+
+
+def flatten_json_column(raw, processes=1):
+    # Parse every payload once and spread its name/value pairs into columns,
+    # processes as in json_flatten.flatten()
+    wide = json_flatten.flatten(raw['json data'], field_types=FIELD_TYPES, column_name=field_column,
+                                processes=processes)
+    flat = raw[[c for c in BASE_COLUMNS if c in raw.columns]].copy()
+    return pd.concat([flat, wide], axis=1)
+
+
+def _part_files(path):
+    return sorted(glob.glob(os.path.join(path, 'part-*.parquet')))
+
+
+def read_snapshot(path):
+    frames = [pd.read_parquet(part) for part in _part_files(path)]
+    if not frames:
+        return pd.DataFrame(columns=BASE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def row_index(raw):
+    hashes = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    return pd.DataFrame({'id': raw['id'].astype(str).to_numpy(), 'hash': hashes})
+
+
+def _row_keys(index):
+    return index['id'] + ':' + index['hash'].astype(str)
+
+
+def _reset_snapshot(path):
+    for part in _part_files(path):
+        os.remove(part)
+    for name in (ROW_INDEX, MANIFEST):
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(path, name))
+
+
+def update_snapshot(raw, path, source=None):
+    # Flattens only rows whose id is not in the snapshot yet and writes them
+    # as a new part. A different source or header, or rows that were
+    # deleted or edited since the last sync, rebuild the snapshot from
+    # scratch. Returns the number of rows written.
+    os.makedirs(path, exist_ok=True)
+    manifest = read_manifest(path)
+    index = row_index(raw)
+    parts = _part_files(path)
+    current = (manifest is not None and parts and manifest.get('source') == str(source)
+               and manifest.get('columns') == list(raw.columns))
+    if current:
+        stored = pd.read_parquet(os.path.join(path, ROW_INDEX))
+        current = bool(_row_keys(stored).isin(_row_keys(index)).all())
+    if not current:
+        _reset_snapshot(path)
+        parts = []
+        new_rows = raw
+    else:
+        new_rows = raw[~index['id'].isin(stored['id']).to_numpy()]
+
+    if not new_rows.empty:
+        flat = flatten_json_column(new_rows)
+        next_part = os.path.join(path, f"part-{len(parts):05d}.parquet")
+        flat.to_parquet(next_part + '.tmp', index=False)
+        os.replace(next_part + '.tmp', next_part)
+    index.to_parquet(os.path.join(path, ROW_INDEX + '.tmp'), index=False)
+    os.replace(os.path.join(path, ROW_INDEX + '.tmp'), os.path.join(path, ROW_INDEX))
+    with open(os.path.join(path, MANIFEST + '.tmp'), 'w') as manifest_file:
+        json.dump({'source': str(source), 'columns': list(raw.columns), 'rows': len(raw)}, manifest_file)
+    os.replace(os.path.join(path, MANIFEST + '.tmp'), os.path.join(path, MANIFEST))
+    if not new_rows.empty and len(parts) + 1 > MAX_PARTS:
+        compact_snapshot(path)
+    return len(new_rows)
+
+
+def compact_snapshot(path):
+    parts = _part_files(path)
+    if len(parts) <= 1:
+        return
+    merged = read_snapshot(path)
+    target = os.path.join(path, 'part-00000.parquet')
+    merged.to_parquet(target + '.tmp', index=False)
+    for part in parts:
+        os.remove(part)
+    os.replace(target + '.tmp', target)
+
+
+def _snapshot_frame(source, snapshot_dir=None):
+    # The snapshot is synced with the CSV only when the CSV itself changed,
+    # otherwise the flattened frame comes straight from the data cache
+    source = str(source)
+    path = snapshot_path(source, snapshot_dir)
+
+    def build():
+        update_snapshot(data_loader.read_csv_cached(source), path, source)
+        return schemas.apply_schema(read_snapshot(path), 'farm_info')
+
+    return data_loader.get_cache().get(
+        ('farm_snapshot', source, path),
+        build,
+        tag_func=lambda: data_loader.source_tag(source),
+        check_on_hit=not data_loader.is_url(source),
+    )
+
+
+def derived(source, name, build, snapshot_dir=None):
+    # build(frame) memoized per snapshot version, see data_loader.derived
+    frame = _snapshot_frame(source, snapshot_dir)
+    return data_loader.derive(frame, ('farm_snapshot', str(source), snapshot_path(source, snapshot_dir), name), build)
+
+
+def parse_record_dates(values):
+    # Record dates come as '15/08/2024' or as 'Aug. 15, 2024' / 'Sept. 2, 2024'
+    return schemas.convert(pd.Series(values, dtype=object), schemas.RECORD_DATE_KIND)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+
+# Stage cell status codes, in order of progress. Growth_Tracker.csv cells
+# read '<status>(<value>)', e.g. 'well and passed(95.7)' or 'current(30)'.
+BLANK, NOT_FOLLOWED, CURRENT, PASSED = range(4)
+STATUS_NAMES = ['', 'not followed', 'current', 'well and passed']
+# A farm counts as in a stage once the stage is current or already passed
+REACHED = CURRENT
+
+_CELL = r'^(well and passed|current|not followed)(?:[^(]*\(\s*([-+]?\d+(?:\.\d+)?)\s*\))?'
+
+
+def parse_cells(values):
+    # (status codes, values) of a sequence of cells. Cells that do not start
+    # with a known status are BLANK, cells without a number get NaN.
+    text = pd.Series(np.asarray(values, dtype=object)).astype(object)
+    parts = text.where(text.isna(), text.astype(str)).str.extract(_CELL)
+    codes = pd.Categorical(parts[0], categories=STATUS_NAMES[1:]).codes.astype('int8') + 1
+    return codes, pd.to_numeric(parts[1], errors='coerce').to_numpy(dtype='float32')
+
+
+class StageTable:
+    # Growth tracker as arrays: status and value per farm x stage, in the
+    # row order of the frame it was parsed from
+    def __init__(self, farms, stages, status, value):
+        self.farms = farms
+        self.stages = stages
+        self.status = status
+        self.value = value
+
+    def __len__(self):
+        return len(self.farms)
+
+    def reached(self):
+        return self.status >= REACHED
+
+    def reached_percentages(self):
+        # Stage -> percentage of farms that reached it
+        if not len(self):
+            return dict.fromkeys(self.stages, 0.0)
+        shares = self.reached().mean(axis=0) * 100
+        return {stage: round(float(share), 2) for stage, share in zip(self.stages, shares)}
+
+    def distribution(self):
+        # Long frame of farms per stage and status, for stacked bar charts
+        counts = np.stack([(self.status == code).sum(axis=0) for code in range(len(STATUS_NAMES))], axis=1)
+        frame = pd.DataFrame(counts, index=pd.Index(self.stages, name='Stage'),
+                             columns=['blank'] + STATUS_NAMES[1:])
+        return frame.reset_index().melt(id_vars='Stage', var_name='Status', value_name='Farms')
+
+    def at_stage(self, stage, status=CURRENT):
+        # Row positions of the farms whose stage has the given status
+        return np.flatnonzero(self.status[:, self.stages.index(stage)] == status)
+
+    def sort_keys(self):
+        # Column -> numeric key sorting a stage by status, then by value;
+        # blanks get NaN so they sort last
+        keys = {}
+        for i, stage in enumerate(self.stages):
+            status = self.status[:, i].astype('float64')
+            key = status * 1000 + np.clip(np.nan_to_num(self.value[:, i].astype('float64')), 0, 999)
+            keys[stage] = np.where(status > BLANK, key, np.nan)
+        return keys
+
+
+def parse(data, farm_column='Farm Name'):
+    # Parses every stage column of the tracker in one pass over the stacked cells
+    stages = [c for c in data.columns if c != farm_column]
+    farms = data[farm_column].astype(object).to_numpy() if farm_column in data.columns else np.arange(len(data))
+    if not stages:
+        empty = np.empty((len(data), 0))
+        return StageTable(farms, stages, empty.astype('int8'), empty.astype('float32'))
+    cells = np.concatenate([data[c].astype(object).to_numpy() for c in stages])
+    status, value = parse_cells(cells)
+    shape = (len(stages), len(data))
+    return StageTable(farms, stages, status.reshape(shape).T.copy(), value.reshape(shape).T.copy())
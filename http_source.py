@@ -0,0 +1,227 @@
+import asyncio
+import email.utils
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import urllib3
+
+
+# Last good copy of every downloaded CSV with its validators, served when
+# the network is down and revalidated with conditional GETs otherwise
+MIRROR_DIR = os.environ.get("ABINBEV_MIRROR_DIR", ".mirror")
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = float(os.environ.get("ABINBEV_HTTP_TIMEOUT", "15"))
+RETRIES = 2
+POOL_SIZE = 8
+# A mirror confirmed current this recently is used without asking the server again
+REVALIDATE_SECONDS = 30
+CHUNK_SIZE = 1 << 16
+
+logger = logging.getLogger(__name__)
+
+
+class _MirrorStream(io.RawIOBase):
+    # Passes a response body through to the reader while copying it into a
+    # temporary file, which replaces the mirror once the body was read to the end
+    def __init__(self, response, source, url):
+        self.response = response
+        self.source = source
+        self.url = url
+        self.done = False
+        os.makedirs(source.mirror_dir, exist_ok=True)
+        fd, self.part = tempfile.mkstemp(dir=source.mirror_dir, suffix='.part')
+        self.copy = os.fdopen(fd, 'wb')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = self.response.readinto(buffer)
+        if n:
+            self.copy.write(memoryview(buffer)[:n])
+        elif not self.done:
+            self.done = True
+            self.copy.close()
+            self.source._commit(self.url, self.part, self.response.headers)
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.response.release_conn()
+            if not self.done:
+                self.copy.close()
+                try:
+                    os.remove(self.part)
+                except OSError:
+                    pass
+        super().close()
+
+
+class HttpSource:
+    # CSVs over HTTP through one pooled client. Reads stream the body
+    # straight to the caller, unchanged files are answered from the mirror
+    # after a conditional GET, and when the server cannot be reached the
+    # mirror is served as it is.
+    def __init__(self, mirror_dir=MIRROR_DIR, timeout=READ_TIMEOUT, retries=RETRIES, pool_size=POOL_SIZE):
+        self.mirror_dir = mirror_dir
+        self.pool = urllib3.PoolManager(
+            maxsize=pool_size,
+            timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=timeout),
+            retries=urllib3.Retry(total=retries, backoff_factor=0.5, raise_on_status=False),
+        )
+        # url -> 'downloaded', 'not modified' or 'offline'
+        self.status = {}
+        self._validated = {}
+        self._lock = threading.Lock()
+
+    def mirror_path(self, url):
+        name = os.path.basename(urllib.parse.urlsplit(url).path) or 'index'
+        return os.path.join(self.mirror_dir, f"{hashlib.sha1(url.encode()).hexdigest()[:12]}-{name}")
+
+    def validators(self, url):
+        # {'etag', 'last_modified', 'saved'} of the mirror, {} without one
+        if not os.path.exists(self.mirror_path(url)):
+            return {}
+        try:
+            with open(self.mirror_path(url) + '.json') as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _commit(self, url, part, headers):
+        path = self.mirror_path(url)
+        os.replace(part, path)
+        meta = {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified'),
+                'saved': email.utils.formatdate(usegmt=True)}
+        fd, meta_part = tempfile.mkstemp(dir=self.mirror_dir, suffix='.part')
+        with os.fdopen(fd, 'w') as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(meta_part, path + '.json')
+        self._mark(url, 'downloaded')
+
+    def _mark(self, url, status, validated=True):
+        with self._lock:
+            self.status[url] = status
+            if validated:
+                self._validated[url] = time.monotonic()
+            else:
+                self._validated.pop(url, None)
+
+    def _is_fresh(self, url):
+        with self._lock:
+            validated = self._validated.get(url)
+        return (validated is not None and time.monotonic() - validated < REVALIDATE_SECONDS
+                and os.path.exists(self.mirror_path(url)))
+
+    def _get(self, url):
+        # Conditional GET, the unread response or None when the mirror is current
+        meta = self.validators(url)
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        # A body shorter than its Content-Length raises instead of reading as
+        # EOF, so a cut-off transfer is never committed as the mirror
+        response = self.pool.request('GET', url, headers=headers, preload_content=False,
+                                     enforce_content_length=True)
+        if response.status == 304 and meta:
+            response.release_conn()
+            self._mark(url, 'not modified')
+            return None
+        if response.status != 200:
+            response.release_conn()
+            raise urllib3.exceptions.HTTPError(f"{url} answered HTTP {response.status}")
+        return response
+
+    def _fallback(self, url, error):
+        path = self.mirror_path(url)
+        if not os.path.exists(path):
+            raise error
+        logger.warning("%s unreachable (%s), serving the copy saved %s",
+                       url, error, self.validators(url).get('saved', 'earlier'))
+        self._mark(url, 'offline', validated=False)
+        return open(path, 'rb')
+
+    def open(self, url):
+        # Binary stream of the current content of url, live or from the mirror
+        if not self._is_fresh(url):
+            try:
+                response = self._get(url)
+            except (urllib3.exceptions.HTTPError, OSError) as error:
+                return self._fallback(url, error)
+            if response is not None:
+                return io.BufferedReader(_MirrorStream(response, self, url), buffer_size=CHUNK_SIZE)
+        return open(self.mirror_path(url), 'rb')
+
+    def read(self, url, parse):
+        # parse(stream) over the body of url. A transfer that breaks off
+        # midway is parsed again from the mirror, when there is one.
+        with self.open(url) as stream:
+            try:
+                return parse(stream)
+            except (urllib3.exceptions.HTTPError, OSError) as error:
+                if not isinstance(stream.raw, _MirrorStream):
+                    raise
+                failure = error
+        with self._fallback(url, failure) as stream:
+            return parse(stream)
+
+    def tag(self, url):
+        # ETag or Last-Modified of url from a HEAD request. A recently
+        # validated mirror answers without a request, an unreachable
+        # server with the validators the mirror was saved with.
+        meta = self.validators(url)
+        if self._is_fresh(url):
+            return meta.get('etag') or meta.get('last_modified')
+        try:
+            response = self.pool.request('HEAD', url)
+        except (urllib3.exceptions.HTTPError, OSError):
+            return meta.get('etag') or meta.get('last_modified')
+        if response.status != 200:
+            return meta.get('etag') or meta.get('last_modified')
+        tag = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        if tag is not None and tag == (meta.get('etag') or meta.get('last_modified')):
+            self._mark(url, 'not modified')
+        return tag
+
+    def download(self, url):
+        # Brings the mirror of url up to date, returns its status
+        if not self._is_fresh(url):
+            with self.open(url) as stream:
+                while stream.read(CHUNK_SIZE):
+                    pass
+        return self.status.get(url, 'not modified')
+
+    async def fetch_all(self, urls):
+        # The downloads run concurrently, each on its own pooled connection
+        statuses = await asyncio.gather(*(asyncio.to_thread(self.download, url) for url in urls),
+                                        return_exceptions=True)
+        return dict(zip(urls, statuses))
+
+    def sync(self, urls):
+        # url -> status, or the exception for a URL with neither server nor mirror
+        return asyncio.run(self.fetch_all(list(urls)))
+
+    def offline(self):
+        with self._lock:
+            return sorted(url for url, status in self.status.items() if status == 'offline')
+
+
+_source = None
+_source_lock = threading.Lock()
+
+
+def get_source():
+    global _source
+    with _source_lock:
+        if _source is None:
+            _source = HttpSource()
+        return _source
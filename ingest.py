@@ -0,0 +1,280 @@
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+import profiling
+import schemas
+
+
+# Columns identifying a visit. The same farm can log the same activity
+# twice on a day, so a row's fingerprint also includes how many times its
+# key was seen before it.
+FINGERPRINT_COLUMNS = ['Date', 'FarmName', 'Activity']
+CHUNK_SIZE = 5000
+MANIFEST = 'manifest.json'
+KEYS_FILE = 'keys.npy'
+# A lock older than this is assumed to be left over from a crashed run
+LOCK_TIMEOUT = 600
+
+
+def store_path(snapshot_dir=None):
+    snapshot_dir = data_loader.SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+    return os.path.join(snapshot_dir, 'visits')
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(path, manifest):
+    def write(tmp):
+        with open(tmp, 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+    data_loader.write_atomic(os.path.join(path, MANIFEST), write)
+
+
+@contextlib.contextmanager
+def _store_lock(path):
+    # Yields False when another ingestion run holds the store
+    lock = os.path.join(path, '.lock')
+    with contextlib.suppress(OSError):
+        if time.time() - os.path.getmtime(lock) > LOCK_TIMEOUT:
+            os.remove(lock)
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        yield False
+        return
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield True
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(lock)
+
+
+def key_hashes(rows):
+    return pd.util.hash_pandas_object(rows[FINGERPRINT_COLUMNS].astype(str), index=False).to_numpy()
+
+
+def key_counts(keys, counts=None):
+    # Occurrences per key hash, added to counts when given
+    chunk = pd.Series(keys, dtype='uint64').value_counts()
+    return chunk if counts is None else counts.add(chunk, fill_value=0).astype('int64')
+
+
+def new_row_mask(keys, stored, seen=None):
+    # A row is new when its key occurs more often up to it (earlier in this
+    # run, seen, plus earlier in this chunk) than the store held it when the
+    # run started (stored). Both are key_counts() series.
+    keys = pd.Series(keys, dtype='uint64')
+    occurrence = keys.groupby(keys).cumcount().to_numpy()
+    if seen is not None and len(seen):
+        occurrence = occurrence + keys.map(seen).fillna(0).to_numpy(dtype='int64')
+    held = keys.map(stored).fillna(0).to_numpy(dtype='int64') if len(stored) else 0
+    return occurrence >= held
+
+
+def _save_keys(target, keys):
+    with open(target, 'wb') as keys_file:
+        np.save(keys_file, keys)
+
+
+def _part_files(path):
+    return sorted(glob.glob(os.path.join(path, 'part-*.parquet')))
+
+
+def _reset_store(path):
+    for part in _part_files(path):
+        os.remove(part)
+    for name in (KEYS_FILE, MANIFEST):
+        with contextlib.suppress(OSError):
+            os.remove(os.path.join(path, name))
+
+
+def _header(source):
+    with open(source, 'rb') as source_file:
+        return source_file.readline().decode('utf-8', errors='replace')
+
+
+def _follows_newline(source, offset):
+    # A resume offset is only valid right after a line break, otherwise the
+    # file was rewritten and has grown past it
+    if not offset:
+        return True
+    with open(source, 'rb') as source_file:
+        source_file.seek(offset - 1)
+        return source_file.read(1) == b'\n'
+
+
+def _read_chunks(source, manifest, chunk_size):
+    # Local files are read from the byte offset where the last run stopped,
+    # URLs are read in full from their local copy and filtered by fingerprint.
+    # Returns the chunks, the offset to resume from and whether the chunks
+    # are only the tail appended since the last run.
+    if data_loader.is_url(source):
+        return pd.read_csv(data_loader.local_copy(source), chunksize=chunk_size, dtype=str), None, False
+    size = os.path.getsize(source)
+    offset = manifest.get('offset') if manifest else None
+    with open(source, 'rb') as source_file:
+        appended = bool(offset and offset <= size)
+        source_file.seek(offset if appended else 0)
+        tail = source_file.read()
+    offset = offset if appended else 0
+    # Only complete lines are parsed, a last line still being written is
+    # read next time from the offset after the last newline
+    last_newline = tail.rfind(b'\n')
+    end = offset + last_newline + 1 if last_newline >= 0 else offset
+    lines = tail[:last_newline + 1]
+    if not lines.strip():
+        chunks = iter(())
+    elif appended:
+        chunks = pd.read_csv(io.BytesIO(lines), chunksize=chunk_size, dtype=str, header=None,
+                             names=manifest['columns'])
+    else:
+        chunks = pd.read_csv(io.BytesIO(lines), chunksize=chunk_size, dtype=str)
+    return chunks, end, appended
+
+
+@profiling.timed('ingest visits')
+def ingest(source, path=None, chunk_size=CHUNK_SIZE, rebuild=False):
+    # Appends rows of source not yet in the store and publishes them as a
+    # new snapshot version. Returns the manifest after the run.
+    source = str(source)
+    path = store_path() if path is None else path
+    os.makedirs(path, exist_ok=True)
+    with _store_lock(path) as locked:
+        if not locked:
+            return read_manifest(path)
+        manifest = read_manifest(path)
+        # Versions keep counting up across rebuilds so readers never see an old number again
+        version = manifest['version'] if manifest else 0
+        if manifest is not None and not data_loader.is_url(source):
+            # A rewritten header, a shorter file or an offset that no longer
+            # falls on a line start means the log was not simply appended
+            # to, so it is ingested from scratch
+            if (manifest.get('source') != source or manifest.get('header') != _header(source)
+                    or manifest.get('offset', 0) > os.path.getsize(source)
+                    or not _follows_newline(source, manifest.get('offset', 0))):
+                manifest = None
+        if rebuild or manifest is None:
+            _reset_store(path)
+            manifest = None
+        known_keys = np.load(os.path.join(path, KEYS_FILE)) if manifest else np.array([], dtype='uint64')
+
+        chunks, end, appended = _read_chunks(source, manifest, chunk_size)
+        # Rows past the resume offset are new by definition, repeats included.
+        # A full read counts keys across chunks against the store as it was
+        # when the run started.
+        stored = key_counts(known_keys)
+        seen = None
+        new_parts = []
+        columns = manifest['columns'] if manifest else None
+        for chunk in chunks:
+            if columns is None:
+                columns = list(chunk.columns)
+            keys = key_hashes(chunk)
+            if appended:
+                fresh = np.ones(len(keys), dtype=bool)
+            else:
+                fresh = new_row_mask(keys, stored, seen)
+                seen = key_counts(keys, seen)
+            if fresh.any():
+                new_parts.append(chunk[fresh])
+                known_keys = np.concatenate([known_keys, keys[fresh]])
+
+        parts = list(manifest['parts']) if manifest else []
+        if new_parts:
+            version += 1
+            part = f"part-{version:05d}.parquet"
+            new_rows = pd.concat(new_parts)
+            new_rows = new_rows.reset_index(drop=True)
+            data_loader.write_atomic(os.path.join(path, part), lambda tmp: new_rows.to_parquet(tmp, index=False))
+            data_loader.write_atomic(os.path.join(path, KEYS_FILE), lambda tmp: _save_keys(tmp, known_keys))
+            parts.append(part)
+        manifest = {
+            'version': version,
+            'rows': int(len(known_keys)),
+            'source': source,
+            'columns': columns or [],
+            'header': None if data_loader.is_url(source) else _header(source),
+            'offset': end,
+            'parts': parts,
+            'updated': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        write_manifest(path, manifest)
+        return manifest
+
+
+def read_store(path=None, manifest=None):
+    path = store_path() if path is None else path
+    manifest = read_manifest(path) if manifest is None else manifest
+    if not manifest or not manifest['parts']:
+        return schemas.apply_schema(
+            pd.DataFrame(columns=(manifest or {}).get('columns') or FINGERPRINT_COLUMNS, dtype=object), 'visits')
+    data = pd.concat([pd.read_parquet(os.path.join(path, part)) for part in manifest['parts']],
+                     ignore_index=True)
+    # Parts keep the CSV's text values, columns are typed as declared on read
+    return schemas.apply_schema(data, 'visits')
+
+
+def _store_frame(source, path=None):
+    # Ingestion runs in-process only when the source changed, otherwise the
+    # published snapshot comes straight from the data cache
+    source = str(source)
+    path = store_path() if path is None else path
+
+    def build():
+        return read_store(path, ingest(source, path))
+
+    return data_loader.get_cache().get(
+        ('visit_store', source, path),
+        build,
+        tag_func=lambda: data_loader.source_tag(source),
+        check_on_hit=not data_loader.is_url(source),
+    )
+
+
+def load_visits(source, path=None):
+    return _store_frame(source, path).copy()
+
+
+def derived(source, name, build, path=None):
+    # build(frame) memoized per published snapshot, see data_loader.derived
+    frame = _store_frame(source, path)
+    return data_loader.derive(frame, ('visit_store', str(source), store_path() if path is None else path, name), build)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append new visits from data.csv to the local visit store.")
+    parser.add_argument('--source', default=data_loader.dataset_path('visits'),
+                        help="path or URL of data.csv (default: %(default)s)")
+    parser.add_argument('--store', default=store_path(), help="store directory (default: %(default)s)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--rebuild', action='store_true', help="drop the store and ingest everything again")
+    args = parser.parse_args(argv)
+
+    before = read_manifest(args.store) or {'rows': 0, 'version': 0}
+    manifest = ingest(args.source, args.store, chunk_size=args.chunk_size, rebuild=args.rebuild)
+    added = manifest['rows'] - (0 if args.rebuild else before['rows'])
+    print(f"version {manifest['version']}: {manifest['rows']} rows ({added} new) in {args.store}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
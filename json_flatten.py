@@ -0,0 +1,107 @@
+import concurrent.futures
+import json
+import os
+
+import pandas as pd
+
+import profiling
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library parser is used without it
+    orjson = None
+
+
+# With processes=None, above this many payloads flatten() spreads the
+# parsing over one process per CPU
+POOL_MIN_ROWS = 50000
+POOL_CHUNK_ROWS = 10000
+
+
+def loads(payload):
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def parse_items(payload):
+    # The [{"name": ..., "value": ...}, ...] list of a payload, None when it
+    # is missing or not valid JSON
+    if not isinstance(payload, (str, bytes)):
+        return None
+    try:
+        items = loads(payload)
+    except ValueError:  # orjson.JSONDecodeError and json.JSONDecodeError are both ValueErrors
+        return None
+    return items if isinstance(items, list) else None
+
+
+def item_pairs(payload):
+    items = parse_items(payload) or []
+    return [(item['name'], item.get('value')) for item in items if isinstance(item, dict) and 'name' in item]
+
+
+def _flatten_chunk(payloads, fields=None):
+    # Each payload is parsed once and all wanted fields are picked from it
+    # in the same pass. A field listed twice keeps its first value.
+    wanted = None if fields is None else set(fields)
+    records = []
+    ok = []
+    for payload in payloads:
+        items = parse_items(payload)
+        record = {}
+        if items is not None:
+            for item in items:
+                if isinstance(item, dict) and 'name' in item:
+                    name = item['name']
+                    if (wanted is None or name in wanted) and name not in record:
+                        record[name] = item.get('value')
+        records.append(record)
+        ok.append(items is not None)
+    return records, ok
+
+
+def _parse_all(payloads, fields, processes):
+    if processes is None:
+        processes = (os.cpu_count() or 1) if len(payloads) >= POOL_MIN_ROWS else 1
+    if processes <= 1 or len(payloads) <= POOL_CHUNK_ROWS:
+        return _flatten_chunk(payloads, fields)
+    chunks = [payloads[i:i + POOL_CHUNK_ROWS] for i in range(0, len(payloads), POOL_CHUNK_ROWS)]
+    records, ok = [], []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        for chunk_records, chunk_ok in pool.map(_flatten_chunk, chunks, [fields] * len(chunks)):
+            records.extend(chunk_records)
+            ok.extend(chunk_ok)
+    return records, ok
+
+
+def convert_field(values, kind):
+    # Malformed values (e.g. '.' as a yield) become missing rather than failing
+    if kind == 'number':
+        return pd.to_numeric(values, errors='coerce')
+    if kind == 'date':
+        return pd.to_datetime(values, format='%Y-%m-%d', errors='coerce')
+    values = values.where(values.isna(), values.astype(str).str.strip())
+    return values.replace('', None)
+
+
+@profiling.timed('json flatten')
+def flatten(payloads, fields=None, field_types=None, column_name=None, processes=1):
+    # Wide frame with one column per JSON field (all fields, or only the
+    # requested ones) and a json_ok flag per payload. Field kinds are
+    # 'number', 'date' or, for anything not in field_types, stripped text.
+    # column_name maps a field name to its column name.
+    # Parsing stays in this process by default, a process pool inside the
+    # app server would fork it per call. Offline callers opt in with a
+    # number of processes, or None to size the pool by row count and CPUs.
+    payloads = pd.Series(payloads)
+    field_types = field_types or {}
+    records, ok = _parse_all(list(payloads), fields, processes)
+
+    wide = pd.DataFrame.from_records(records, index=payloads.index, columns=fields)
+    for name in wide.columns:
+        wide[name] = convert_field(wide[name].astype(object), field_types.get(name))
+    if column_name is not None:
+        wide = wide.rename(columns=column_name)
+    wide.insert(0, 'json_ok', ok)
+    return wide
@@ -0,0 +1,198 @@
+import hashlib
+import threading
+
+import pandas as pd
+
+import growth_stages
+import table_renderer
+
+
+# 1 kachha bigha = 1000 sq. yards, the unit the field team reports rates in
+BIGHA_M2 = 836.13
+
+# Summary label -> operations.csv column, rates there are already per bigha
+RATE_METRICS = {
+    'Applied DAP/Total plot area (kg/Bigha)': 'DAP/MOP Fertilizer Applied quantity',
+    'Applied MOP/Total plot area (kg/Bigha)': 'DAP/MOP Fertilizer Applied quantity',
+    'Applied UREA1/Total plot area (kg/Bigha)': 'UREA1 Fertilizer Applied quantity',
+    'Sown seed/Total plot area (kg/Bigha)': 'Seeding Rate',
+}
+
+# Summary label of every Growth_Tracker.csv stage column
+STAGE_METRIC = 'Percentage of Farms in {} Stage'
+
+# Summary label -> activity_avinbev.csv column
+ACTIVITY_METRICS = {
+    'Percentage of Farms in which sowing is done': 'Sowing',
+    'Percentage of Farms in which MOP/DAP is applied': 'M0P/DAP',
+    'Percentage of Farms in which UREA1 is applied': 'UREA 1',
+    'Percentage of Farms on which Irrigation 1 is done': 'Irrigation 1',
+    'Percentage of Farms on which Weeding 1 is done': 'Weeding 1',
+}
+
+# Rows of operations.csv that are totals rather than farms
+NON_FARM_ROWS = {'Commulative'}
+
+
+def activity_done(value):
+    return isinstance(value, str) and value.strip() in table_renderer.DONE_STATUSES
+
+
+def _percentage(count, total):
+    return round(100 * count / total, 2) if total else 0.0
+
+
+class _FarmTable:
+    # Latest row per farm of a per-farm tracker CSV. Only rows whose content
+    # changed since the last sync are re-read, and per-column flag counts are
+    # adjusted by the difference instead of being recounted.
+    def __init__(self, columns, flag=None):
+        self.columns = columns
+        self.flag = flag
+        self.rows = {}
+        self.hashes = {}
+        self.counts = dict.fromkeys(columns, 0)
+
+    def sync(self, frame, key_column='Farm Name'):
+        frame = frame[~frame[key_column].isin(NON_FARM_ROWS)].drop_duplicates(key_column, keep='last')
+        hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+        seen = set()
+        for position, farm in enumerate(frame[key_column]):
+            seen.add(farm)
+            if self.hashes.get(farm) == hashes[position]:
+                continue
+            row = frame.iloc[position]
+            self._set(farm, {c: row[c] for c in self.columns if c in frame.columns})
+            self.hashes[farm] = hashes[position]
+        for farm in set(self.rows) - seen:
+            self._set(farm, None)
+            self.hashes.pop(farm, None)
+
+    def _set(self, farm, values):
+        if self.flag is not None:
+            for column in self.columns:
+                old = self.rows.get(farm, {}).get(column)
+                new = (values or {}).get(column)
+                self.counts[column] += int(self.flag(new)) - int(self.flag(old))
+        if values is None:
+            self.rows.pop(farm, None)
+        else:
+            self.rows[farm] = values
+
+
+class MetricsStore:
+    # Macro View KPIs derived from the source CSVs. The visit log is treated
+    # as append-only: each sync folds in only the rows added since the last
+    # one, the per-farm trackers are diffed row by row.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = _FarmTable(sorted(set(RATE_METRICS.values())))
+        self.stages = growth_stages.parse(pd.DataFrame(columns=['Farm Name']))
+        self._stages_hash = None
+        self.activity = _FarmTable(sorted(set(ACTIVITY_METRICS.values())), flag=activity_done)
+        self._reset_visits()
+
+    def _reset_visits(self):
+        self.plot_area = {}
+        self.germination = {}
+        self.tiller_min = None
+        self.tiller_max = None
+        self.visit_rows = 0
+        self._last_visit = None
+
+    @staticmethod
+    def _row_key(row):
+        return tuple(str(v) for v in row)
+
+    def add_visits(self, rows):
+        # Folds newly appended visit rows into the running aggregates
+        if rows.empty:
+            return
+        by_farm = rows.groupby('FarmName', observed=True)
+        if 'Plot Area in m2' in rows.columns:
+            for farm, area in by_farm['Plot Area in m2'].last().dropna().items():
+                self.plot_area[farm] = float(area)
+        for farm in by_farm.size().index:
+            self.plot_area.setdefault(farm, float('nan'))
+        if 'GERMINATION VALUE(%)' in rows.columns:
+            germination = pd.to_numeric(rows['GERMINATION VALUE(%)'], errors='coerce')
+            for farm, value in germination.groupby(rows['FarmName'], observed=True).max().dropna().items():
+                self.germination[farm] = max(value, self.germination.get(farm, value))
+        if 'Tiller value' in rows.columns:
+            tiller = pd.to_numeric(rows['Tiller value'], errors='coerce').dropna()
+            if not tiller.empty:
+                low, high = tiller.min(), tiller.max()
+                self.tiller_min = low if self.tiller_min is None else min(self.tiller_min, low)
+                self.tiller_max = high if self.tiller_max is None else max(self.tiller_max, high)
+        self.visit_rows += len(rows)
+        self._last_visit = self._row_key(rows.iloc[-1])
+
+    def sync(self, visits=None, operations=None, growth=None, activity=None):
+        with self._lock:
+            if visits is not None:
+                # A shorter frame or a changed last row means the log was
+                # rewritten rather than appended to, so start over
+                if len(visits) < self.visit_rows or (
+                        self.visit_rows and self._row_key(visits.iloc[self.visit_rows - 1]) != self._last_visit):
+                    self._reset_visits()
+                self.add_visits(visits.iloc[self.visit_rows:])
+            if operations is not None:
+                self.operations.sync(operations)
+            if growth is not None:
+                self._sync_stages(growth)
+            if activity is not None:
+                self.activity.sync(activity)
+        return self
+
+    def _sync_stages(self, frame, key_column='Farm Name'):
+        # The tracker is reparsed as a whole, only when its content changed
+        frame = frame[~frame[key_column].isin(NON_FARM_ROWS)].drop_duplicates(key_column, keep='last')
+        digest = hashlib.sha1(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes()).hexdigest()
+        if digest != self._stages_hash:
+            self.stages = growth_stages.parse(frame, key_column)
+            self._stages_hash = digest
+
+    def _weighted_rate(self, column):
+        # Per-bigha rates weighted by plot area, farms without a known area
+        # weigh as much as the average plot
+        areas = pd.Series(self.plot_area, dtype='float64')
+        fallback = areas.mean() if areas.notna().any() else 1.0
+        total = weight = 0.0
+        for farm, row in self.operations.rows.items():
+            rate = pd.to_numeric(row.get(column), errors='coerce')
+            if pd.isna(rate):
+                continue
+            area = self.plot_area.get(farm)
+            area = fallback if area is None or pd.isna(area) else area
+            total += rate * area
+            weight += area
+        return round(total / weight, 2) if weight else 0.0
+
+    def metrics(self):
+        with self._lock:
+            germination = pd.Series(self.germination, dtype='float64')
+            metrics = {
+                'Total Plot Area (Bigha)': round(pd.Series(self.plot_area, dtype='float64').sum() / BIGHA_M2, 2),
+                'Number of Farms': len(self.plot_area),
+            }
+            for label, column in RATE_METRICS.items():
+                metrics[label] = self._weighted_rate(column)
+            for stage, share in self.stages.reached_percentages().items():
+                metrics[STAGE_METRIC.format(stage)] = share
+            for label, column in ACTIVITY_METRICS.items():
+                metrics[label] = _percentage(self.activity.counts[column], len(self.activity.rows))
+            metrics.update({
+                'Maximum Germination Rate (%)': round(germination.max(), 2) if len(germination) else 0.0,
+                'Average Germination Rate (%)': round(germination.mean(), 2) if len(germination) else 0.0,
+                'Minimum Germination Rate (%)': round(germination.min(), 2) if len(germination) else 0.0,
+                'Maximum Tillage Rate (%)': self.tiller_max if self.tiller_max is not None else 0,
+                'Minimum Tillage Rate (%)': self.tiller_min if self.tiller_min is not None else 0,
+            })
+            return metrics
+
+
+_store = MetricsStore()
+
+
+def get_store():
+    return _store
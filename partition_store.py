@@ -0,0 +1,313 @@
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import urllib.parse
+
+import pandas as pd
+
+import data_loader
+import ingest
+import profiling
+import schemas
+
+
+# Column each dataset is partitioned by farm on
+FARM_COLUMNS = {
+    'visits': 'FarmName',
+    'operations': 'Farm Name',
+    'farm_info': 'farmName',
+    'activity': 'Farm Name',
+    'growth': 'Farm Name',
+}
+# Dated datasets take each row's season from its date. The trackers hold the
+# state of one season and are filed under the season they are imported for.
+DATE_COLUMNS = {
+    'visits': ('Date', schemas.SCHEMAS['visits']['Date']),
+    'farm_info': ('Date', schemas.RECORD_DATE_KIND),
+}
+# A season runs from this month to the one before it a year later, e.g. '2024-25'
+SEASON_START_MONTH = 4
+# Position of a row in its source, so partitions read back in source order
+ROW_COLUMN = '__row'
+# Filtered reads (one per farm and date range browsed) are kept in a cache of
+# their own, so they never push the full datasets out of the shared one
+READ_CACHE_ENTRIES = int(os.environ.get("ABINBEV_PARTITION_CACHE_ENTRIES", "32"))
+
+_reads = data_loader.DataCache(max_entries=READ_CACHE_ENTRIES)
+
+
+def store_path(name, snapshot_dir=None):
+    snapshot_dir = data_loader.SNAPSHOT_DIR if snapshot_dir is None else snapshot_dir
+    return os.path.join(snapshot_dir, 'partitioned', name)
+
+
+def season_of(dates):
+    dates = pd.Series(dates)
+    year = (dates.dt.year - (dates.dt.month < SEASON_START_MONTH)).astype('Int64')
+    labels = year.astype(str) + '-' + ((year + 1) % 100).astype(str).str.zfill(2)
+    return labels.where(dates.notna())
+
+
+def current_season():
+    return season_of(pd.Series([pd.Timestamp.today()])).iloc[0]
+
+
+def default_season(snapshot_dir=None):
+    # Trackers are filed under the latest season with visits, or the current one
+    manifest = ingest.read_manifest(store_path('visits', snapshot_dir)) or {'partitions': []}
+    return max((p['season'] for p in manifest['partitions'] if p['season']), default=current_season())
+
+
+def _partition_dir(season, farm):
+    return os.path.join(f"season={urllib.parse.quote(season, safe='')}",
+                        f"farm={urllib.parse.quote(farm, safe='')}")
+
+
+def _content_hash(rows):
+    return hashlib.sha1(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def _row_dates(name, rows):
+    column, kind = DATE_COLUMNS[name]
+    if column not in rows.columns:
+        return pd.Series(pd.NaT, index=rows.index, dtype='datetime64[ns]')
+    return schemas.convert(rows[column], kind)
+
+
+def _read_partition(path, partition):
+    return pd.read_parquet(os.path.join(path, partition['file']))
+
+
+def import_frame(name, raw, path=None, season=None, append=False, info=None):
+    # Files the text rows of raw (with their ROW_COLUMN positions) into
+    # season/farm partitions and publishes a new manifest version.
+    # Partitions of the seasons being imported are replaced, unless append
+    # is set, in which case rows are added to them. Partitions whose content
+    # did not change keep their file. info is stored in the manifest as is.
+    path = store_path(name) if path is None else path
+    os.makedirs(path, exist_ok=True)
+    manifest = ingest.read_manifest(path) or {'version': 0, 'rows': 0, 'farms': [], 'partitions': []}
+    version = manifest['version'] + 1
+    farm_column = FARM_COLUMNS[name]
+
+    farms = raw[farm_column].fillna('') if farm_column in raw.columns else pd.Series('', index=raw.index)
+    if name in DATE_COLUMNS:
+        dates = _row_dates(name, raw)
+        seasons = season_of(dates).fillna(season or '')
+    else:
+        dates = None
+        seasons = pd.Series(season or default_season(), index=raw.index)
+
+    current = {(p['season'], p['farm']): p for p in manifest['partitions']}
+    imported = set(seasons)
+    partitions = [p for key, p in current.items() if append or key[0] not in imported]
+    for (row_season, farm), rows in raw.groupby([seasons, farms], sort=False):
+        previous = current.get((row_season, farm))
+        if append and previous is not None:
+            partitions.remove(previous)
+            rows = pd.concat([_read_partition(path, previous), rows], ignore_index=True)
+        rows = rows.reset_index(drop=True)
+        content = _content_hash(rows)
+        if previous is not None and previous['hash'] == content:
+            partitions.append(previous)
+            continue
+        entry = {
+            'season': row_season,
+            'farm': farm,
+            'file': os.path.join(_partition_dir(row_season, farm), f"part-{version:05d}.parquet"),
+            'rows': int(len(rows)),
+            'hash': content,
+            'first_row': int(rows[ROW_COLUMN].min()) if len(rows) else 0,
+            'start': None,
+            'end': None,
+        }
+        if dates is not None:
+            row_dates = _row_dates(name, rows)
+            if row_dates.notna().any():
+                entry['start'] = row_dates.min().date().isoformat()
+                entry['end'] = row_dates.max().date().isoformat()
+        os.makedirs(os.path.join(path, os.path.dirname(entry['file'])), exist_ok=True)
+        data_loader.write_atomic(os.path.join(path, entry['file']), lambda tmp: rows.to_parquet(tmp, index=False))
+        partitions.append(entry)
+
+    # Farms in order of their first row in the source
+    first_rows = {}
+    for partition in partitions:
+        farm, first = partition['farm'], partition['first_row']
+        first_rows[farm] = min(first, first_rows.get(farm, first))
+    manifest = dict(manifest, **(info or {}), **{
+        'version': version,
+        'dataset': name,
+        'columns': [c for c in raw.columns if c != ROW_COLUMN] or manifest.get('columns', []),
+        'rows': int(sum(p['rows'] for p in partitions)),
+        'farms': [farm for farm in sorted(first_rows, key=first_rows.get) if farm],
+        'partitions': sorted(partitions, key=lambda p: (p['season'], p['farm'])),
+    })
+    ingest.write_manifest(path, manifest)
+
+    # Files no longer referenced by the published manifest
+    referenced = {os.path.normpath(p['file']) for p in partitions}
+    for part in glob.glob(os.path.join(path, 'season=*', 'farm=*', 'part-*.parquet')):
+        if os.path.normpath(os.path.relpath(part, path)) not in referenced:
+            os.remove(part)
+    return manifest
+
+
+def import_csv(name, source, path=None, season=None):
+    raw = pd.read_csv(source, dtype=str)
+    raw[ROW_COLUMN] = range(len(raw))
+    return import_frame(name, raw, path, season=season,
+                        info={'source': str(source), 'tag': data_loader.source_tag(source)})
+
+
+def import_visits(source, path=None, visit_store=None):
+    # Visits come from the incremental visit store: parts it published since
+    # the last import are appended to their partitions, a rebuilt visit
+    # store is imported again in full
+    path = store_path('visits') if path is None else path
+    published = ingest.ingest(source, visit_store)
+    manifest = ingest.read_manifest(path)
+    if published is None:
+        # Another run is ingesting for the first time, serve what was imported
+        return manifest or import_frame('visits', pd.DataFrame(columns=[ROW_COLUMN]), path)
+    imported = manifest.get('visit_parts', []) if manifest else []
+    visit_store = ingest.store_path() if visit_store is None else visit_store
+    if manifest and published['parts'][:len(imported)] == imported:
+        new_parts, rows, append = published['parts'][len(imported):], manifest['rows'], True
+    else:
+        new_parts, rows, append = published['parts'], 0, False
+    if not new_parts and manifest is not None:
+        return manifest
+    raw = pd.concat([pd.read_parquet(os.path.join(visit_store, part)) for part in new_parts],
+                    ignore_index=True) if new_parts else pd.DataFrame(columns=published['columns'])
+    raw[ROW_COLUMN] = range(rows, rows + len(raw))
+    return import_frame('visits', raw, path, append=append,
+                        info={'source': str(source), 'visit_parts': published['parts']})
+
+
+def import_all(data_dir=None, snapshot_dir=None, season=None):
+    manifests = {}
+    # Visits go first, their seasons decide where the trackers are filed
+    for name in sorted(data_loader.DATASETS, key=lambda name: name != 'visits'):
+        source = data_loader.dataset_path(name, data_dir)
+        path = store_path(name, snapshot_dir)
+        if name == 'visits':
+            visit_store = None if snapshot_dir is None else ingest.store_path(snapshot_dir)
+            manifests[name] = import_visits(source, path, visit_store)
+        else:
+            manifests[name] = import_csv(name, source, path, season=season or default_season(snapshot_dir))
+    return manifests
+
+
+def select_partitions(manifest, seasons=None, farms=None, start=None, end=None):
+    # Partition pruning: only partitions of the given seasons and farms whose
+    # date span overlaps [start, end] are read
+    start = None if start is None else pd.Timestamp(start).date().isoformat()
+    end = None if end is None else pd.Timestamp(end).date().isoformat()
+    seasons = None if seasons is None else set(seasons)
+    farms = None if farms is None else {str(farm) for farm in farms}
+    selected = []
+    for partition in manifest['partitions']:
+        if seasons is not None and partition['season'] not in seasons:
+            continue
+        if farms is not None and partition['farm'] not in farms:
+            continue
+        if start is not None and partition['end'] is not None and partition['end'] < start:
+            continue
+        if end is not None and partition['start'] is not None and partition['start'] > end:
+            continue
+        selected.append(partition)
+    return selected
+
+
+@profiling.timed('read partitions')
+def read_partitions(name, path=None, seasons=None, farms=None, start=None, end=None, manifest=None):
+    path = store_path(name) if path is None else path
+    manifest = ingest.read_manifest(path) if manifest is None else manifest
+    selected = select_partitions(manifest, seasons, farms, start, end) if manifest else []
+    if not selected:
+        columns = (manifest or {}).get('columns') or [FARM_COLUMNS[name]]
+        return schemas.apply_schema(pd.DataFrame(columns=columns, dtype=object), name)
+    raw = pd.concat([_read_partition(path, p) for p in selected], ignore_index=True)
+    raw = raw.sort_values(ROW_COLUMN, kind='mergesort')
+    raw = raw.drop(columns=ROW_COLUMN).reset_index(drop=True)
+    if name in DATE_COLUMNS and (start is not None or end is not None):
+        # Partitions overlapping the range can still hold rows outside it
+        dates = _row_dates(name, raw)
+        keep = pd.Series(True, index=raw.index)
+        if start is not None:
+            keep &= dates >= pd.Timestamp(start).normalize()
+        if end is not None:
+            keep &= dates < pd.Timestamp(end).normalize() + pd.Timedelta(days=1)
+        raw = raw[keep].reset_index(drop=True)
+    return schemas.apply_schema(raw, name)
+
+
+def _synced_manifest(name, source, path=None, season=None):
+    # Re-imports a dataset only when its source changed
+    source = str(source)
+    path = store_path(name) if path is None else path
+
+    def build():
+        if name == 'visits':
+            return import_visits(source, path)
+        manifest = ingest.read_manifest(path)
+        tag = data_loader.source_tag(source)
+        if manifest and manifest.get('source') == source and (tag is None or manifest.get('tag') == tag):
+            return manifest
+        return import_csv(name, source, path, season=season)
+
+    return data_loader.get_cache().get(
+        ('partition_manifest', name, source, path),
+        build,
+        tag_func=lambda: data_loader.source_tag(source),
+        check_on_hit=not data_loader.is_url(source),
+    )
+
+
+def load(name, source=None, seasons=None, farms=None, start=None, end=None, path=None):
+    # Rows of a dataset for the given seasons, farms and inclusive date range,
+    # read from the partitions that can hold them
+    source = data_loader.dataset_path(name) if source is None else source
+    path = store_path(name) if path is None else path
+    manifest = _synced_manifest(name, source, path)
+    key = ('partitioned', name, path, manifest['version'],
+           None if seasons is None else tuple(sorted(seasons)),
+           None if farms is None else tuple(sorted(map(str, farms))),
+           None if start is None else str(pd.Timestamp(start).date()),
+           None if end is None else str(pd.Timestamp(end).date()))
+    frame = _reads.get(key, lambda: read_partitions(name, path, seasons, farms, start, end, manifest))
+    return frame.copy()
+
+
+def get_read_cache():
+    return _reads
+
+
+def load_visits(source, farms=None, start=None, end=None, seasons=None, path=None):
+    return load('visits', source, seasons=seasons, farms=farms, start=start, end=end, path=path)
+
+
+def farms(name, source=None, path=None):
+    source = data_loader.dataset_path(name) if source is None else source
+    return list(_synced_manifest(name, source, path)['farms'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the dashboard CSVs into the season/farm partitioned store.")
+    parser.add_argument('--data-dir', default=None, help="directory or URL holding the CSVs (default: DATA_DIR)")
+    parser.add_argument('--snapshots', default=None, help="snapshot directory (default: SNAPSHOT_DIR)")
+    parser.add_argument('--season', default=None,
+                        help="season the tracker CSVs are filed under, e.g. 2024-25 (default: current season)")
+    args = parser.parse_args(argv)
+
+    for name, manifest in import_all(args.data_dir, args.snapshots, args.season).items():
+        print(f"{name}: version {manifest['version']}, {manifest['rows']} rows in "
+              f"{len(manifest['partitions'])} partitions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import argparse
+import datetime
+import functools
+import json
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+import plotly.io as pio
+# Registers the 'streamlit' plotly template, the app's default
+import streamlit.elements.lib.streamlit_plotly_theme
+
+import charts
+import dashboard_data
+import data_loader
+import partition_store
+import schemas
+import table_renderer
+import thresholds
+from metrics_store import MetricsStore
+
+
+ARTIFACT_DIR = os.environ.get("ABINBEV_ARTIFACT_DIR", ".artifacts")
+CURRENT = 'current.json'
+# Versions kept on disk, so a viewer still reading the previous one is not cut off
+KEEP_VERSIONS = 2
+POLL_SECONDS = 60
+
+TRACKERS = ['activity', 'growth', 'operations']
+# Datasets the Macro View artifacts are computed from
+MACRO_SOURCES = ['visits', 'operations', 'growth', 'activity']
+
+# Figures are built with the template the app would build them with
+pio.templates.default = 'streamlit'
+
+
+def source_tags(data_dir=None):
+    return {name: data_loader.source_tag(data_loader.dataset_path(name, data_dir)) for name in data_loader.DATASETS}
+
+
+def read_current(artifact_dir=None):
+    artifact_dir = ARTIFACT_DIR if artifact_dir is None else artifact_dir
+    try:
+        with open(os.path.join(artifact_dir, CURRENT)) as current_file:
+            manifest = json.load(current_file)
+    except (OSError, ValueError):
+        return None
+    manifest['path'] = os.path.join(artifact_dir, manifest['version'])
+    return manifest
+
+
+def is_fresh(manifest, names, daily=False):
+    # Artifacts match the sources they were built from. Local sources are
+    # checked with a stat(), URLs with a HEAD request that the mirror answers
+    # itself while recently validated. Daily artifacts (visits counted per
+    # day) also expire at midnight.
+    if manifest is None:
+        return False
+    if daily and manifest['day'] != datetime.date.today().isoformat():
+        return False
+    for name in names:
+        source = data_loader.dataset_path(name)
+        if manifest['tags'].get(name) != data_loader.source_tag(source):
+            return False
+    return True
+
+
+@functools.lru_cache(maxsize=32)
+def _read_text(path):
+    # Artifact files never change once published, so each is read once
+    with open(path) as artifact_file:
+        return artifact_file.read()
+
+
+def _read_json(path):
+    return json.loads(_read_text(path))
+
+
+def _frame(split):
+    return pd.read_json(json.dumps(split), orient='split', convert_dates=False)
+
+
+def tracker_table(manifest, kind):
+    # {'columns', 'head', 'rows', 'errors'} of a tracker, plus 'compliance' for
+    # the operations one, None when stale or missing
+    if not is_fresh(manifest, [kind]):
+        return None
+    try:
+        table = dict(_read_json(os.path.join(manifest['path'], f"{kind}.json")))
+    except OSError:
+        return None
+    table['errors'] = _frame(table['errors'])
+    if 'compliance' in table:
+        table['compliance'] = _frame(table['compliance'])
+    return table
+
+
+def macro_view(manifest):
+    # Unfiltered Macro View summary and figures, None when stale or missing
+    if not is_fresh(manifest, MACRO_SOURCES, daily=True):
+        return None
+    try:
+        macro = _read_json(os.path.join(manifest['path'], 'macro.json'))
+    except OSError:
+        return None
+    return {
+        'summary': _frame(macro['summary']),
+        'activities_summary': pd.Series(macro['activities_summary']['values'],
+                                        index=macro['activities_summary']['index'], dtype='int64'),
+        'seed_varieties': pd.Categorical(macro['seed_varieties']),
+        'figures': macro['figures'],
+    }
+
+
+def macro_figure(manifest, name):
+    # A published Macro View figure, from the version macro_view() was read from
+    return pio.from_json(_read_text(os.path.join(manifest['path'], 'figures', f"{name}.json")))
+
+
+def _write_json(path, value):
+    _write_text(path, json.dumps(value, default=str))
+
+
+def _write_text(path, text):
+    def write(tmp):
+        with open(tmp, 'w') as artifact_file:
+            artifact_file.write(text)
+    data_loader.write_atomic(path, write)
+
+
+def _split(frame):
+    # Cells holding a whole Series (the activity counts in the summary) are kept as text
+    frame = frame.copy()
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            frame[column] = [str(v.to_dict()) if isinstance(v, pd.Series) else v for v in frame[column]]
+    return json.loads(frame.to_json(orient='split', date_format='iso', default_handler=str))
+
+
+def build_trackers(out_dir, data_dir=None):
+    loaders = {'activity': dashboard_data.load_activity_table, 'growth': dashboard_data.load_growth_table,
+               'operations': dashboard_data.load_operations_table}
+    for kind in TRACKERS:
+        table = loaders[kind](data_loader.dataset_path(kind, data_dir))
+        head, rows = table_renderer.tracker_parts(kind, table.data)
+        artifact = {
+            'columns': table.columns,
+            'head': head,
+            'rows': list(rows),
+            'errors': _split(schemas.schema_errors(table.data)),
+        }
+        if kind == 'operations':
+            artifact['compliance'] = _split(thresholds.compliance(table.data))
+        _write_json(os.path.join(out_dir, f"{kind}.json"), artifact)
+        # Standalone fragment of the whole table, for serving without the app
+        fragment = table_renderer.STYLESHEET + table_renderer.scroll_container(
+            table_renderer.wrap_table(head, ''.join(rows)))
+        _write_text(os.path.join(out_dir, f"{kind}.html"), fragment)
+
+
+def build_macro(out_dir, data_dir=None):
+    visits_source = data_loader.dataset_path('visits', data_dir)
+    visits = partition_store.load_visits(visits_source)
+    operations = data_loader.read_csv_cached(data_loader.dataset_path('operations', data_dir), schema='operations')
+    growth = data_loader.read_csv_cached(data_loader.dataset_path('growth', data_dir), schema='growth')
+    activity = data_loader.read_csv_cached(data_loader.dataset_path('activity', data_dir), schema='activity')
+    metrics = MetricsStore().sync(visits=visits, operations=operations, growth=growth, activity=activity).metrics()
+    summary_df, activities_summary, seed_varieties = dashboard_data.generate_summary(visits, metrics=metrics)
+    stage_table = dashboard_data.load_stage_table(data_loader.dataset_path('growth', data_dir))
+    builders = dashboard_data.macro_figure_builders(operations, charts.ActivityCube(visits), stage_table)
+    for name, build in builders.items():
+        _write_text(os.path.join(out_dir, 'figures', f"{name}.json"), build().to_json())
+    _write_json(os.path.join(out_dir, 'macro.json'), {
+        'summary': _split(summary_df),
+        'activities_summary': {'index': [str(i) for i in activities_summary.index],
+                               'values': [int(v) for v in activities_summary.to_numpy()]},
+        'seed_varieties': [str(v) for v in seed_varieties],
+        'figures': list(builders),
+    })
+
+
+def _versions(artifact_dir):
+    if not os.path.isdir(artifact_dir):
+        return []
+    return sorted(d for d in os.listdir(artifact_dir) if d.startswith('v') and d[1:].isdigit())
+
+
+def publish(artifact_dir=None, data_dir=None, tags=None):
+    # Builds every artifact into a new version directory, then points
+    # current.json at it; readers only ever see complete versions
+    artifact_dir = ARTIFACT_DIR if artifact_dir is None else artifact_dir
+    tags = source_tags(data_dir) if tags is None else tags
+    # Numbered past every version on disk, not just the current one: with
+    # current.json lost, reusing a number would rewrite files in place
+    # that readers cache as immutable
+    previous = read_current(artifact_dir)
+    numbers = [int(v[1:]) for v in _versions(artifact_dir)] + ([int(previous['version'][1:])] if previous else [])
+    version = f"v{max(numbers, default=0) + 1:05d}"
+    out_dir = os.path.join(artifact_dir, version)
+    os.makedirs(os.path.join(out_dir, 'figures'), exist_ok=True)
+    build_trackers(out_dir, data_dir)
+    build_macro(out_dir, data_dir)
+    manifest = {
+        'version': version,
+        'tags': tags,
+        'day': datetime.date.today().isoformat(),
+        'built': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    _write_json(os.path.join(artifact_dir, CURRENT), manifest)
+
+    for old in _versions(artifact_dir)[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(artifact_dir, old), ignore_errors=True)
+    return manifest
+
+
+def refresh(artifact_dir=None, data_dir=None, force=False):
+    # Publishes a new version when a source changed or the day rolled over,
+    # returns the new manifest or None when the current one still holds
+    current = read_current(artifact_dir)
+    data_loader.prefetch(data_dir=data_dir)
+    tags = source_tags(data_dir)
+    if (not force and current is not None and current['tags'] == tags
+            and current['day'] == datetime.date.today().isoformat()):
+        return None
+    data_loader.clear_cache()
+    return publish(artifact_dir, data_dir, tags)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Precompute the tracker tables and the Macro View into static artifacts the app serves.")
+    parser.add_argument('--artifacts', default=ARTIFACT_DIR, help="artifact directory (default: %(default)s)")
+    parser.add_argument('--data-dir', default=None, help="directory or URL of the CSVs (default: DATA_DIR)")
+    parser.add_argument('--watch', action='store_true', help="keep running and rebuild whenever a source changes")
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="seconds between checks with --watch")
+    parser.add_argument('--force', action='store_true', help="rebuild even if no source changed")
+    args = parser.parse_args(argv)
+
+    force = args.force
+    while True:
+        manifest = refresh(args.artifacts, args.data_dir, force=force)
+        if manifest is not None:
+            print(f"published {manifest['version']} at {manifest['built']}", flush=True)
+        elif not args.watch:
+            print("artifacts are up to date")
+        if not args.watch:
+            return 0
+        force = False
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
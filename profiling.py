@@ -0,0 +1,128 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+
+# Profiling is opt-in: with ABINBEV_PROFILE=1 the sidebar offers a toggle
+# that times the reruns of the session that turns it on
+ENABLED = os.environ.get("ABINBEV_PROFILE", "") == "1"
+# Every profiled rerun's stages are appended here as JSON lines
+TRACE_FILE = os.environ.get("ABINBEV_TRACE_FILE", os.path.join(".traces", "trace.jsonl"))
+
+_local = threading.local()
+
+
+def _rss_mb():
+    # Resident set size of the process, None where /proc is not available
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Profiler:
+    # Records named, possibly nested stages of one rerun with their wall
+    # time, memory delta and the hits and misses of the given caches
+    # (objects with hits and misses counters) while the stage ran
+    def __init__(self, name, counters=None):
+        self.name = name
+        self.rerun = uuid.uuid4().hex[:8]
+        self.counters = counters or {}
+        self.records = []
+        self.started = time.perf_counter()
+        self.wall_start = time.time()
+        self._depth = 0
+
+    def _counts(self):
+        return {name: (counter.hits, counter.misses) for name, counter in self.counters.items()}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        counts = self._counts()
+        rss = _rss_mb()
+        started = time.perf_counter()
+        self._depth += 1
+        record = {'stage': name, 'depth': self._depth - 1, 'start': started - self.started}
+        self.records.append(record)
+        try:
+            yield record
+        finally:
+            self._depth -= 1
+            record['seconds'] = time.perf_counter() - started
+            after = _rss_mb()
+            record['memory_mb'] = None if rss is None or after is None else after - rss
+            for counter, (hits, misses) in self._counts().items():
+                before_hits, before_misses = counts[counter]
+                if hits != before_hits or misses != before_misses:
+                    record[f"{counter} hits"] = hits - before_hits
+                    record[f"{counter} misses"] = misses - before_misses
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def trace_lines(self):
+        for record in self.records:
+            yield json.dumps(dict(record, rerun=self.rerun, view=self.name,
+                                  time=self.wall_start + record['start']), default=str)
+
+    def chrome_trace(self):
+        # Chrome trace event format, for chrome://tracing or Perfetto
+        events = []
+        for record in self.records:
+            args = {k: v for k, v in record.items() if k not in ('stage', 'start', 'seconds', 'depth')}
+            events.append({
+                'name': record['stage'],
+                'ph': 'X',
+                'ts': int((self.wall_start + record['start']) * 1e6),
+                'dur': int(record.get('seconds', 0) * 1e6),
+                'pid': os.getpid(),
+                'tid': self.rerun,
+                'args': args,
+            })
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, default=str)
+
+    def export(self, path=TRACE_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a') as trace_file:
+            for line in self.trace_lines():
+                trace_file.write(line + '\n')
+
+
+def start(name, counters=None):
+    # Profiles the rest of this thread's rerun
+    _local.profiler = Profiler(name, counters)
+    return _local.profiler
+
+
+def finish():
+    profiler = current()
+    _local.profiler = None
+    return profiler
+
+
+def current():
+    return getattr(_local, 'profiler', None)
+
+
+def stage(name):
+    # Times a block when the running thread is being profiled, costs
+    # nothing otherwise (background warm-up threads never are)
+    profiler = current()
+    return profiler.stage(name) if profiler is not None else contextlib.nullcontext()
+
+
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
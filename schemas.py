@@ -0,0 +1,150 @@
+import pandas as pd
+
+import profiling
+
+
+# Declared column types per dataset. Kinds:
+#   'category'            low-cardinality text
+#   'text'                free text kept as object
+#   'boolean'             TRUE/FALSE flags, missing means not recorded
+#   'Int16'/'Int32'/'Int64', 'float32'/'float64'   nullable numbers
+#   'date:<fmt>[|<fmt>]'  dates in one of the given strptime formats
+SCHEMAS = {
+    'visits': {
+        'Date': 'date:%d/%m/%Y',
+        'FarmName': 'category',
+        'Plot Area in m2': 'Int32',
+        'Activity': 'category',
+        'Image_url': 'text',
+        'sequence of visit': 'Int16',
+        'tillage': 'category',
+        'DAP(kg)': 'float32',
+        'MOP(kg)': 'float32',
+        'SEED': 'float32',
+        'GERMINATION VALUE(%)': 'float32',
+        'Channels Constructed': 'category',
+        'Sprinker installed': 'boolean',
+        'Irrigation Done': 'boolean',
+        'Seed Variety': 'category',
+        'Activity image': 'text',
+        'Growth Stage/Alert': 'category',
+        'Weeding': 'category',
+        'Soil': 'category',
+        'Severity': 'category',
+        'Weeding Done': 'boolean',
+        'Fertilization Done': 'boolean',
+        'Tiller value': 'float32',
+    },
+    'operations': {
+        'Farm Name': 'text',
+        # Holds ranges like '10-20 May' on the cumulative row, so not a date
+        'Sowing Date': 'text',
+        'Seeding Rate': 'float64',
+        'DAP/MOP Fertilizer Applied quantity': 'float64',
+        'UREA1 Fertilizer Applied quantity': 'float64',
+        'UREA2 Fertilizer Applied quantity': 'float64',
+    },
+    'farm_info': {
+        'id': 'Int64',
+        'activity_record': 'category',
+        'Image URL': 'text',
+        'farmName': 'category',
+        'json data': 'text',
+        # Shown as recorded, parsed separately with record_date_formats
+        'Date': 'text',
+    },
+    'activity': {
+        'Farm Name': 'text',
+    },
+    'growth': {
+        'Farm Name': 'text',
+    },
+}
+
+# Columns not listed above take the dataset's default kind
+DEFAULT_KINDS = {
+    'activity': 'category',
+    'growth': 'category',
+}
+
+# Farm Information record dates: '15/08/2024' or 'Aug. 15, 2024'
+RECORD_DATE_KIND = 'date:%d/%m/%Y|%b %d, %Y|%B %d, %Y'
+
+
+def column_kind(name, column):
+    return SCHEMAS.get(name, {}).get(column, DEFAULT_KINDS.get(name))
+
+
+def parse_dates(values, formats):
+    values = pd.Series(values, dtype=object)
+    text = values.where(values.isna(), values.astype(str).str.strip())
+    dates = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for fmt in formats:
+        candidates = text
+        if '%b' in fmt or '%B' in fmt:
+            # 'Sept.' is not a strptime abbreviation and the dots are not part of it
+            candidates = text.str.replace('Sept', 'Sep', regex=False).str.replace('.', '', regex=False)
+        dates = dates.fillna(pd.to_datetime(candidates, format=fmt, errors='coerce'))
+    return dates
+
+
+def convert(values, kind):
+    if kind is None or kind == 'text':
+        return values
+    if kind == 'category':
+        return values.astype('category')
+    if kind == 'boolean':
+        flags = values.astype(str).str.strip().str.upper().map({'TRUE': True, 'FALSE': False})
+        return flags.where(values.notna()).astype('boolean')
+    if kind.startswith('date:'):
+        return parse_dates(values, kind[len('date:'):].split('|'))
+    numeric = pd.to_numeric(values, errors='coerce')
+    if kind.startswith('Int'):
+        # Values with a fraction cannot be stored, they are reported instead
+        numeric = numeric.where(numeric.isna() | (numeric % 1 == 0))
+    return numeric.astype(kind)
+
+
+@profiling.timed('parse types')
+def apply_schema(data, name):
+    # Converts every column to its declared kind. Values that were present
+    # but could not be converted are reported per row in
+    # data.attrs['schema_errors'] instead of failing the load.
+    typed = data.copy()
+    errors = []
+    for column in data.columns:
+        kind = column_kind(name, column)
+        if kind is None:
+            continue
+        values = data[column]
+        converted = convert(values, kind)
+        failed = values.notna() & converted.isna()
+        if failed.any():
+            errors.append(pd.DataFrame({
+                'row': failed.index[failed],
+                'column': column,
+                'value': values[failed].astype(str),
+                'expected': kind,
+            }))
+        typed[column] = converted
+    typed.attrs['schema_errors'] = (pd.concat(errors, ignore_index=True) if errors
+                                    else pd.DataFrame(columns=['row', 'column', 'value', 'expected']))
+    return typed
+
+
+def schema_errors(data):
+    return data.attrs.get('schema_errors', pd.DataFrame(columns=['row', 'column', 'value', 'expected']))
+
+
+def fill_blank(data):
+    # fillna('') for display, category columns get '' as an extra category
+    data = data.copy()
+    for column in data.columns:
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            if '' not in values.cat.categories:
+                values = values.cat.add_categories([''])
+            data[column] = values.fillna('')
+        elif values.dtype == object:
+            data[column] = values.fillna('')
+    return data
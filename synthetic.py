@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+import schemas
+from partition_store import FARM_COLUMNS
+
+
+# Rows copied once rather than per replica
+SINGLE_ROWS = {'Commulative'}
+# Visit dates of a replicated farm move by up to this many days
+MAX_DATE_SHIFT = 7
+
+
+def read_template(name, data_dir=None):
+    return pd.read_csv(data_loader.dataset_path(name, data_dir), dtype=str)
+
+
+def replicate(template, scale, farm_column):
+    # template repeated scale times, every copy after the first with its
+    # farms renamed so the result has scale times as many farms
+    single = template[farm_column].isin(SINGLE_ROWS).to_numpy()
+    rows = np.flatnonzero(~single)
+    positions = np.concatenate([np.tile(rows, scale), np.flatnonzero(single)])
+    replicas = np.concatenate([np.repeat(np.arange(scale), len(rows)), np.zeros(single.sum(), dtype=int)])
+    data = template.iloc[positions].reset_index(drop=True)
+    suffix = (' R' + pd.Series(replicas).astype(str)).where(replicas > 0, '')
+    data[farm_column] = data[farm_column].where(data[farm_column].isna(), data[farm_column] + suffix)
+    return data, replicas
+
+
+def visits(template, scale, rng=None):
+    rng = np.random.default_rng(0) if rng is None else rng
+    data, replicas = replicate(template, scale, FARM_COLUMNS['visits'])
+    # Each replicated farm gets its own date offset
+    farm_codes, farms = pd.factorize(data['FarmName'])
+    shifts = rng.integers(-MAX_DATE_SHIFT, MAX_DATE_SHIFT + 1, size=len(farms))
+    shifts = np.where(farm_codes >= 0, shifts[farm_codes], 0) * (replicas > 0)
+    dates = schemas.convert(data['Date'], schemas.SCHEMAS['visits']['Date'])
+    shifted = (dates + pd.to_timedelta(shifts, unit='D')).dt.strftime('%d/%m/%Y')
+    data['Date'] = shifted.where(dates.notna(), data['Date'])
+    return data
+
+
+def farm_info(template, scale):
+    data, _ = replicate(template, scale, FARM_COLUMNS['farm_info'])
+    data['id'] = np.arange(1, len(data) + 1)[::-1].astype(str)
+    return data
+
+
+def generate(name, scale, data_dir=None, rng=None):
+    template = read_template(name, data_dir)
+    if name == 'visits':
+        return visits(template, scale, rng)
+    if name == 'farm_info':
+        return farm_info(template, scale)
+    return replicate(template, scale, FARM_COLUMNS[name])[0]
+
+
+def write_datasets(out_dir, scale, data_dir=None, seed=0):
+    # The five CSVs at scale times the size of the shipped ones, written
+    # under the same file names so out_dir can serve as DATA_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = {}
+    for name, filename in data_loader.DATASETS.items():
+        paths[name] = os.path.join(out_dir, filename)
+        generate(name, scale, data_dir, rng).to_csv(paths[name], index=False)
+    return paths
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+
+QUERY_CACHE_ENTRIES = 16
+
+
+class TableIndex:
+    # Search and sort index over a tracker table. Built once per data
+    # version, after which each query only returns row positions and the
+    # page being shown is the only part of the frame that gets rendered.
+    def __init__(self, data, sort_keys=None):
+        self.data = data.reset_index(drop=True)
+        # Column -> numeric key to sort by instead of the cell values
+        self.sort_keys = sort_keys or {}
+        text = [self.data[c].astype(str).str.lower() for c in self.data.columns]
+        self._text = reduce(lambda a, b: a + '\x1f' + b, text) if text else pd.Series([''] * len(self.data))
+        self._orders = {}
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def columns(self):
+        return list(self.data.columns)
+
+    def order(self, column):
+        # Stable ascending order of a column, blanks and NaN last
+        with self._lock:
+            if column not in self._orders:
+                if column in self.sort_keys:
+                    values = pd.Series(self.sort_keys[column], dtype='float64')
+                else:
+                    values = self.data[column].astype(object).replace('', np.nan)
+                    numeric = pd.to_numeric(values, errors='coerce')
+                    if numeric.notna().sum() == values.notna().sum():
+                        values = numeric
+                ordered = values.sort_values(kind='mergesort', na_position='last')
+                self._orders[column] = (ordered.index.to_numpy(), int(ordered.notna().sum()))
+            return self._orders[column]
+
+    def query(self, search='', sort_by=None, ascending=True):
+        key = (search.strip().lower(), sort_by, ascending)
+        with self._lock:
+            if key in self._queries:
+                self._queries.move_to_end(key)
+                return self._queries[key]
+        search, _, _ = key
+        if sort_by:
+            positions, filled = self.order(sort_by)
+            if not ascending:
+                positions = np.concatenate([positions[:filled][::-1], positions[filled:]])
+        else:
+            positions = np.arange(len(self.data))
+        if search:
+            matches = self._text.str.contains(search, regex=False).to_numpy()
+            positions = positions[matches[positions]]
+        with self._lock:
+            self._queries[key] = positions
+            while len(self._queries) > QUERY_CACHE_ENTRIES:
+                self._queries.popitem(last=False)
+        return positions
+
+    def rows(self, positions):
+        return self.data.iloc[positions]
+
+
+def window_size(pages, page_size, total):
+    return min(total, max(1, pages) * page_size)
@@ -0,0 +1,170 @@
+import hashlib
+import html
+
+import numpy as np
+import pandas as pd
+
+import data_loader
+import growth_stages
+import profiling
+import thresholds
+
+
+# One stylesheet shared by every tracker table, cells only carry a class name
+STYLESHEET = """<style>
+.abinbev-table {border-collapse: collapse; font-size: 15px; font-family: Arial;}
+.abinbev-table th {background-color: #333; color: white; border: 1px solid #ddd; padding: 8px;}
+.abinbev-table td {border: 1px solid #ddd; padding: 8px;}
+.abinbev-table td.blank {background-color: white; color: black;}
+.abinbev-table td.done-early {background-color: lightblue; color: black;}
+.abinbev-table td.done {background-color: lightgreen; color: black;}
+.abinbev-table td.pending {background-color: lightyellow; color: black;}
+.abinbev-table td.late {background-color: lightcoral; color: black;}
+.abinbev-table td.by-nature {background-color: lightgrey; color: black;}
+.abinbev-table td.current {background-color: yellow; color: black;}
+.abinbev-table td.passed {background-color: green; color: black;}
+.abinbev-table td.not-followed {background-color: red; color: black;}
+.abinbev-table td.in-range {background-color: lightgreen;}
+.abinbev-table td.out-of-range {background-color: red;}
+.abinbev-table td.farm-name {background-color: white; color: grey;}
+.abinbev-scroll {max-height: 640px; overflow: auto;}
+.abinbev-table th:first-child {position: sticky; left: 0; background-color: #f1f1f1;}
+.abinbev-table td:first-child {position: sticky; left: 0; background-color: #f1f1f1;}
+.abinbev-table tr:first-child th {position: sticky; top: 0; background-color: #f1f1f1;}
+</style>"""
+
+# Activity Status cell value -> class
+STATUS_CLASSES = {
+    'Done early': 'done-early',
+    'Done on time': 'done',
+    'Done': 'done',
+    'Pending': 'pending',
+    'Not done on time': 'late',
+    'Done by nature': 'by-nature',
+}
+# Activity Status values that count an activity as done, in the tracker's
+# colouring and in the Macro View completion percentages alike
+DONE_STATUSES = {'Done early', 'Done on time', 'Done', 'Done by nature'}
+
+# Growth Tracker stage status code -> class
+STAGE_CLASSES = np.array(['blank', 'not-followed', 'current', 'passed'], dtype=object)
+
+CACHE_MAX_ENTRIES = 32
+
+
+def value_classes(values, mapping, default=''):
+    # Exact value -> class through categorical codes into a small class table,
+    # values missing from the mapping get code -1 and land on the default
+    codes = pd.Categorical(values, categories=list(mapping)).codes
+    table = np.array(list(mapping.values()) + [default], dtype=object)
+    return table[codes]
+
+
+def _cell_text(values, escape):
+    series = pd.Series(values)
+    if pd.api.types.is_float_dtype(series.dtype):
+        text = series.map('{:.2f}'.format).where(series.notna(), '')
+    else:
+        text = series.astype(object).where(series.notna(), '').astype(str)
+    if escape:
+        text = text.map(html.escape)
+    return text.to_numpy(dtype=object)
+
+
+def render_parts(df, cell_classes=None, index=True, escape=True):
+    # Builds the table column by column: each column becomes an array of
+    # '<td class=...>text</td>' strings and rows are joined at the end.
+    # Returns the header row and an array with one '<tr>...</tr>' per row.
+    cell_classes = cell_classes or {}
+    n_rows = len(df)
+    columns = []
+    if index:
+        labels = _cell_text(df.index.to_numpy(), escape)
+        columns.append('<tr><th>' + labels + '</th>')
+    else:
+        columns.append(np.full(n_rows, '<tr>', dtype=object))
+    for column in df.columns:
+        classes = cell_classes.get(column)
+        if classes is None:
+            open_tags = np.full(n_rows, '<td>', dtype=object)
+        else:
+            classes = np.asarray(classes, dtype=object)
+            open_tags = np.where(classes == '', '<td>', '<td class="' + classes + '">')
+        columns.append(open_tags + _cell_text(df[column].to_numpy(), escape) + '</td>')
+    rows = (np.sum(columns, axis=0) + '</tr>') if n_rows else np.array([], dtype=object)
+
+    header = '<th></th>' if index else ''
+    header += ''.join(f'<th>{html.escape(str(c)) if escape else c}</th>' for c in df.columns)
+    return f'<tr>{header}</tr>', rows
+
+
+def wrap_table(header, body, table_class='abinbev-table'):
+    return f'<table class="{table_class}"><thead>{header}</thead><tbody>{body}</tbody></table>'
+
+
+@profiling.timed('render table')
+def render_html(df, cell_classes=None, index=True, escape=True, table_class='abinbev-table'):
+    header, rows = render_parts(df, cell_classes, index, escape)
+    return wrap_table(header, ''.join(rows), table_class)
+
+
+# Rendered HTML keyed on (renderer, frame hash), least recently used dropped
+_cache = data_loader.DataCache(ttl=float('inf'), max_entries=CACHE_MAX_ENTRIES)
+
+
+def frame_key(df):
+    hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    return tuple(df.columns), hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+def scroll_container(table_html):
+    # Fixed-height scroll area, header row and first column stay sticky inside it
+    return f'<div class="abinbev-scroll">{table_html}</div>'
+
+
+def activity_status_classes(df):
+    return {c: value_classes(df[c], STATUS_CLASSES, 'blank') for c in df.columns}
+
+
+def growth_tracker_classes(df):
+    stages = growth_stages.parse(df)
+    classes = {stage: STAGE_CLASSES[stages.status[:, i]] for i, stage in enumerate(stages.stages)}
+    if 'Farm Name' in df.columns:
+        classes['Farm Name'] = np.full(len(df), 'farm-name', dtype=object)
+    return classes
+
+
+def operations_tracker_classes(df):
+    # Tolerance bands come from the threshold rules
+    return thresholds.RuleCheck(df).cell_classes()
+
+
+# Tracker -> (cell classes of a frame, whether cell text is escaped)
+TRACKERS = {
+    'activity': (activity_status_classes, False),
+    'growth': (growth_tracker_classes, True),
+    'operations': (operations_tracker_classes, True),
+}
+
+
+def render_tracker(kind, df):
+    classes, escape = TRACKERS[kind]
+    return _cache.get((kind, frame_key(df)), lambda: render_html(df, classes(df), escape=escape))
+
+
+def tracker_parts(kind, df):
+    # Header and per-row HTML of a tracker, rows can be joined into any window
+    classes, escape = TRACKERS[kind]
+    return render_parts(df, classes(df), escape=escape)
+
+
+def render_activity_status(df):
+    return render_tracker('activity', df)
+
+
+def render_growth_tracker(df):
+    return render_tracker('growth', df)
+
+
+def render_operations_tracker(df):
+    return render_tracker('operations', df)
@@ -0,0 +1,83 @@
+import os
+
+import pandas as pd
+
+import ingest
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _visits():
+    return pd.read_csv(os.path.join(HERE, 'data.csv'), dtype=str)
+
+
+def test_appended_repeat_row_is_kept(tmp_path):
+    source = tmp_path / 'data.csv'
+    visits = _visits()
+    visits.to_csv(source, index=False)
+    store = str(tmp_path / 'store')
+    assert ingest.ingest(source, store)['rows'] == len(visits)
+
+    # The same visit logged again is a genuine new row
+    repeated = pd.concat([visits, visits.tail(1)], ignore_index=True)
+    repeated.to_csv(source, index=False)
+    manifest = ingest.ingest(source, store)
+    assert manifest['rows'] == len(repeated)
+    assert len(ingest.read_store(store, manifest)) == len(repeated)
+
+
+def test_repeats_across_chunks_are_kept(tmp_path):
+    source = tmp_path / 'data.csv'
+    visits = _visits()
+    visits.to_csv(source, index=False)
+    store = str(tmp_path / 'store')
+    manifest = ingest.ingest(source, store, chunk_size=100)
+    assert manifest['rows'] == len(visits)
+
+    assert len(ingest.read_store(store, manifest)) == len(visits)
+
+
+def test_full_read_counts_repeats_against_the_store():
+    # Key 1 is stored twice and read three times across two chunks: only the
+    # third occurrence is new. Key 2 is not stored, both copies are new.
+    stored = ingest.key_counts([1, 1])
+    first = ingest.new_row_mask([1, 2], stored)
+    seen = ingest.key_counts([1, 2])
+    second = ingest.new_row_mask([1, 1, 2], stored, seen)
+    assert first.tolist() == [False, True]
+    assert second.tolist() == [False, True, True]
+
+
+def test_unterminated_last_line_is_read_once(tmp_path):
+    source = tmp_path / 'data.csv'
+    visits = _visits()
+    text = visits.to_csv(index=False)
+    last = text.rstrip('\n').rsplit('\n', 1)[1]
+    # The last row is still being written: no line break after it yet
+    source.write_text(text.rstrip('\n'))
+    store = str(tmp_path / 'store')
+    assert ingest.ingest(source, store)['rows'] == len(visits) - 1
+
+    source.write_text(text + last + '\n')
+    manifest = ingest.ingest(source, store)
+    assert manifest['rows'] == len(visits) + 1
+    assert len(ingest.read_store(store, manifest)) == len(visits) + 1
+
+
+def test_rewritten_file_past_the_offset_is_rebuilt(tmp_path):
+    source = tmp_path / 'data.csv'
+    visits = _visits()
+    visits.head(100).to_csv(source, index=False)
+    store = str(tmp_path / 'store')
+    assert ingest.ingest(source, store)['rows'] == 100
+
+    # Same header, different rows, and the old offset now falls mid-line
+    rewritten = visits.iloc[100:].copy()
+    rewritten['FarmName'] = rewritten['FarmName'].fillna('') + ' (rewritten)'
+    rewritten.to_csv(source, index=False)
+    manifest = ingest.ingest(source, store)
+    assert manifest['rows'] == len(rewritten)
+    stored = ingest.read_store(store, manifest)
+    assert len(stored) == len(rewritten)
+    assert stored['FarmName'].str.endswith(' (rewritten)').all()
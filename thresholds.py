@@ -0,0 +1,82 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import metrics_store
+
+
+# Operations Tracker column -> agronomic target and inclusive tolerance band,
+# all in KG/Bigha. A new input (UREA2, a pesticide dose) only needs an entry
+# here, or in the JSON file named by ABINBEV_RULES_FILE, which replaces these.
+DEFAULT_RULES = {
+    'Seeding Rate': {'target': 8, 'low': 7.5, 'high': 8.5},
+    'DAP/MOP Fertilizer Applied quantity': {'target': 10, 'low': 9.5, 'high': 10.5},
+    'UREA1 Fertilizer Applied quantity': {'target': 7, 'low': 6.5, 'high': 7.5},
+}
+RULES_FILE = os.environ.get("ABINBEV_RULES_FILE")
+
+
+def load_rules(path=RULES_FILE):
+    if not path:
+        return DEFAULT_RULES
+    with open(path) as rules_file:
+        rules = json.load(rules_file)
+    for column, rule in rules.items():
+        missing = {'target', 'low', 'high'} - set(rule)
+        if missing:
+            raise ValueError(f"threshold rule for {column!r} lacks {', '.join(sorted(missing))}")
+    return rules
+
+
+RULES = load_rules()
+
+
+def reference(column, rules=None):
+    # Target drawn as the reference line of a usage chart
+    return (RULES if rules is None else rules)[column]['target']
+
+
+class RuleCheck:
+    # All rules of a frame evaluated at once: values is a rows x rules float
+    # matrix, checked marks the cells holding a number and violations the
+    # checked cells outside their band
+    def __init__(self, df, rules=None):
+        rules = RULES if rules is None else rules
+        self.columns = [c for c in rules if c in df.columns]
+        self.index = df.index
+        if self.columns:
+            self.values = np.column_stack(
+                [pd.to_numeric(df[c], errors='coerce').to_numpy(dtype='float64') for c in self.columns])
+        else:
+            self.values = np.empty((len(df), 0))
+        low = np.array([rules[c]['low'] for c in self.columns], dtype='float64')
+        high = np.array([rules[c]['high'] for c in self.columns], dtype='float64')
+        self.checked = ~np.isnan(self.values)
+        self.violations = self.checked & ((self.values < low) | (self.values > high))
+
+    def cell_classes(self, inside='in-range', outside='out-of-range'):
+        # Column -> table cell class per row, blank where there is no number
+        classes = np.where(self.violations, outside, inside).astype(object)
+        classes[~self.checked] = ''
+        return {c: classes[:, i] for i, c in enumerate(self.columns)}
+
+    def compliance(self, farms):
+        # One row per farm: rules checked, rules violated and which ones.
+        # A farm with no value to check is not counted as compliant.
+        labels = np.where(self.violations, np.array(self.columns, dtype=object) + ', ', '')
+        violated = pd.Series(labels.sum(axis=1) if self.columns else '', index=self.index).str[:-2]
+        summary = pd.DataFrame({
+            'Farm Name': np.asarray(farms, dtype=object),
+            'Checked': self.checked.sum(axis=1),
+            'Violations': self.violations.sum(axis=1),
+            'Out of range': violated.to_numpy(dtype=object),
+        }, index=self.index)
+        summary['Compliant'] = (summary['Violations'] == 0) & (summary['Checked'] > 0)
+        return summary
+
+
+def compliance(df, rules=None, farm_column='Farm Name'):
+    farms = df[~df[farm_column].isin(metrics_store.NON_FARM_ROWS)]
+    return RuleCheck(farms, rules).compliance(farms[farm_column]).reset_index(drop=True)
@@ -0,0 +1,112 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import profiling
+
+
+THUMBNAIL_DIR = os.environ.get("ABINBEV_THUMBNAIL_DIR", ".thumbnails")
+THUMBNAIL_SIZE = (320, 320)
+# Upper bound on simultaneous image downloads
+MAX_WORKERS = 8
+# An image that could not be fetched or decoded is not tried again for this long
+FAILURE_TTL = 300
+# Directory holding the images by file name, served instead of the image URLs
+IMAGE_DIR = os.environ.get("ABINBEV_IMAGE_DIR", "")
+
+
+def http_fetcher(url, timeout=15):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+def directory_fetcher(root):
+    # Stand-in for cloud storage: serves the file in root named like the URL's last path segment
+    def fetch(url):
+        name = os.path.basename(urllib.parse.urlparse(url).path)
+        with open(os.path.join(root, name), 'rb') as image_file:
+            return image_file.read()
+    return fetch
+
+
+class ThumbnailService:
+    # Downscaled copies of remote images, stored on disk under a hash of the
+    # URL so each image is fetched and resized at most once
+    def __init__(self, fetcher=http_fetcher, cache_dir=THUMBNAIL_DIR, size=THUMBNAIL_SIZE,
+                 max_workers=MAX_WORKERS):
+        self.fetcher = fetcher
+        self.cache_dir = cache_dir
+        self.size = size
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='thumbnails')
+        # path -> monotonic time until which a failed image is not retried
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, url):
+        digest = hashlib.sha1(f"{url}|{self.size[0]}x{self.size[1]}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.jpg")
+
+    def get(self, url):
+        # Path of the thumbnail for url, or None when the image cannot be
+        # fetched or decoded. Failures are remembered for FAILURE_TTL, so a
+        # broken URL does not hold a pool worker on every rerun.
+        if not isinstance(url, str) or not url:
+            return None
+        path = self.path_for(url)
+        if os.path.exists(path):
+            return path
+        with self._lock:
+            if time.monotonic() < self._failed.get(path, 0):
+                return None
+        if self._make(url, path):
+            return path
+        with self._lock:
+            self._failed[path] = time.monotonic() + FAILURE_TTL
+        return None
+
+    def _make(self, url, path):
+        try:
+            image = Image.open(io.BytesIO(self.fetcher(url)))
+            image.thumbnail(self.size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Each writer gets its own temporary file, two threads or
+            # sessions resolving the same URL never share one
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        except (OSError, ValueError):
+            return False
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                image.convert('RGB').save(tmp_file, 'JPEG', quality=80)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        return True
+
+    @profiling.timed('thumbnails')
+    def get_many(self, urls):
+        # Resolves thumbnails on the bounded pool, keeps the input order
+        urls = list(urls)
+        return dict(zip(urls, self._pool.map(self.get, urls)))
+
+
+_service = None
+
+
+def get_service():
+    global _service
+    if _service is None:
+        _service = ThumbnailService(fetcher=directory_fetcher(IMAGE_DIR) if IMAGE_DIR else http_fetcher)
+    return _service
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+def _day(value):
+    return pd.Timestamp(value).normalize().to_datetime64()
+
+
+class DailyVisitIndex:
+    # Per-day index of the visit log. Built once per data version, it answers
+    # "how many farms were visited on day D" with a binary search over sorted
+    # day keys instead of rescanning the frame.
+    def __init__(self, data, date_column='Date', key_column='FarmName'):
+        dates = data[date_column]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, dayfirst=True, errors='coerce')
+        days = dates.dt.normalize().to_numpy(dtype='datetime64[ns]')
+        codes, _ = pd.factorize(data[key_column])
+
+        # Distinct (day, farm) pairs, NaT dates and missing farms left out
+        valid = ~np.isnat(days) & (codes >= 0)
+        pairs = pd.DataFrame({'day': days[valid], 'code': codes[valid]}).drop_duplicates()
+        self.day_keys, self.day_counts = np.unique(pairs['day'].to_numpy(), return_counts=True)
+
+    def visited_on(self, day):
+        position = np.searchsorted(self.day_keys, _day(day))
+        if position < len(self.day_keys) and self.day_keys[position] == _day(day):
+            return int(self.day_counts[position])
+        return 0
+
+
+def value_counts(values):
+    # Category columns list every category, only the ones that occur are kept
+    counts = values.value_counts()
+    counts = counts[counts > 0]
+    counts.index = counts.index.astype(object)
+    return counts
+
+
+def aggregate_visits(data):
+    # Totals used by the summary, computed in one pass over each column block
+    def column(name):
+        return data[name] if name in data.columns else pd.Series(dtype='float64')
+
+    numeric = pd.DataFrame({
+        'DAP(kg)': column('DAP(kg)'),
+        'MOP(kg)': column('MOP(kg)'),
+        'SEED': column('SEED'),
+        'GERMINATION VALUE(%)': column('GERMINATION VALUE(%)'),
+    }).apply(pd.to_numeric, errors='coerce')
+    stats = numeric.agg(['sum', 'mean', 'max', 'min'])
+    flags = pd.DataFrame({
+        'Irrigation Done': column('Irrigation Done'),
+        'Sprinker installed': column('Sprinker installed'),
+    }).notna().sum()
+    return {
+        'total_dap': stats.at['sum', 'DAP(kg)'],
+        'total_mop': stats.at['sum', 'MOP(kg)'],
+        'total_seed_used': stats.at['sum', 'SEED'],
+        'avg_germination_rate': stats.at['mean', 'GERMINATION VALUE(%)'],
+        'max_germination_rate': stats.at['max', 'GERMINATION VALUE(%)'],
+        'min_germination_rate': stats.at['min', 'GERMINATION VALUE(%)'],
+        'num_irrigation_done': int(flags['Irrigation Done']),
+        'num_sprinkler_installed': int(flags['Sprinker installed']),
+        'activities_summary': value_counts(column('Activity')),
+        'seed_varieties': column('Seed Variety').dropna().unique(),
+    }
@@ -0,0 +1,94 @@
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+
+
+MAX_WORKERS = int(os.environ.get("ABINBEV_WARMUP_WORKERS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    # Loads and prepares datasets on a thread pool in the background. There
+    # is one per server process, so whatever it loads lands in the shared
+    # caches for every session; dashboards wait on it instead of starting a
+    # second cold load of the same data.
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix='warmup')
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._seconds = {}
+
+    def start(self, tasks):
+        # Submits tasks (name -> callable) not started yet, returns at once
+        with self._lock:
+            for name, task in tasks.items():
+                if name not in self._futures:
+                    self._futures[name] = self._executor.submit(self._run, name, task)
+
+    def restart(self, tasks):
+        with self._lock:
+            for name in tasks:
+                self._futures.pop(name, None)
+                self._seconds.pop(name, None)
+        self.start(tasks)
+
+    def _run(self, name, task):
+        started = time.perf_counter()
+        try:
+            return task()
+        except Exception:
+            logger.exception("warm-up of %s failed", name)
+            raise
+        finally:
+            with self._lock:
+                self._seconds[name] = time.perf_counter() - started
+
+    def status(self):
+        # name -> 'loading', 'ready' or 'failed'
+        with self._lock:
+            futures = dict(self._futures)
+        status = {}
+        for name, future in futures.items():
+            if not future.done():
+                status[name] = 'loading'
+            else:
+                status[name] = 'failed' if future.exception() is not None else 'ready'
+        return status
+
+    def seconds(self):
+        with self._lock:
+            return dict(self._seconds)
+
+    def is_ready(self, *names):
+        # Names never submitted count as ready, there is nothing to wait for
+        with self._lock:
+            futures = [self._futures[name] for name in names if name in self._futures]
+        return all(future.done() for future in futures)
+
+    def wait(self, names, timeout=None):
+        # Blocks until the named tasks finished, failed ones included. A
+        # failed warm-up leaves the dashboard to load the data itself.
+        with self._lock:
+            futures = [self._futures[name] for name in names if name in self._futures]
+        done, _ = concurrent.futures.wait(futures, timeout=timeout)
+        return len(done) == len(futures)
+
+    def progress(self):
+        status = self.status()
+        return sum(value == 'ready' for value in status.values()), len(status)
+
+
+_warmup = None
+_warmup_lock = threading.Lock()
+
+
+def get_warmup():
+    global _warmup
+    with _warmup_lock:
+        if _warmup is None:
+            _warmup = Warmup()
+        return _warmup